@@ -0,0 +1,61 @@
+"""Measure bcrypt throughput per work factor and thread count.
+
+Reports hashes/sec overall and per core, which is what to look at
+before raising BCRYPT_LOG_ROUNDS or sizing PASSWORD_HASH_WORKERS.
+
+    python benchmarks/bcrypt_benchmark.py --rounds 10 11 12 --threads 1 2 4
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from flaskblog import create_app  # noqa: E402
+from flaskblog.passwords import hash_password, matches_any  # noqa: E402
+
+app = create_app()
+
+
+def hashes_per_second(threads, count):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(hash_password, ["benchmark-password"] * count))
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--count", type=int, default=16)
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"cores: {cores}")
+    print(f"{'rounds':>6} {'threads':>7} {'hash/s':>9} {'hash/s/core':>11} {'history ms':>10}")
+
+    with app.app_context():
+        for rounds in args.rounds:
+            app.config["BCRYPT_LOG_ROUNDS"] = rounds
+            history = [hash_password(f"old-{i}") for i in range(5)]
+            for threads in args.threads:
+                app.config["PASSWORD_HASH_WORKERS"] = threads
+                rate = hashes_per_second(threads, args.count)
+
+                # worst case history check: no match, all five hashes verified
+                start = time.perf_counter()
+                matches_any(history, "not-in-history")
+                history_ms = (time.perf_counter() - start) * 1000
+
+                print(f"{rounds:>6} {threads:>7} {rate:>9.1f} "
+                      f"{rate / min(threads, cores):>11.1f} {history_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Hammer like/comment writes from several processes against one SQLite file.
+
+Each worker process is a separate app instance (like gunicorn workers),
+logs in as its own user and toggles likes / posts comments as fast as it
+can. Failed requests ("database is locked" surfaces as a 500) are counted.
+
+Run once with the default engine tuning and once without the SQLite
+pragmas to compare:
+
+    python benchmarks/concurrent_writes.py --workers 8 --requests 200
+    python benchmarks/concurrent_writes.py --workers 8 --requests 200 --no-pragmas
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+POSTS = 20
+PASSWORD = "benchmark-password"
+
+
+def _configure(db_path, pragmas, busy_timeout):
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+    os.environ["MAIL_QUEUE_BACKEND"] = "sync"
+    os.environ["DB_SQLITE_PRAGMAS"] = "1" if pragmas else "0"
+    if busy_timeout is not None:
+        os.environ["DB_SQLITE_BUSY_TIMEOUT"] = str(busy_timeout)
+
+
+def seed(workers):
+    from flaskblog import create_app, db
+    from flaskblog.models import User, Post
+    from flaskblog.passwords import hash_password
+
+    app = create_app({"RATELIMIT_BACKEND": "none"})
+    with app.app_context():
+        db.create_all()
+        password = hash_password(PASSWORD)
+        for n in range(workers):
+            db.session.add(User(
+                username=f"writer{n}", email=f"writer{n}@example.com",
+                password=password, verified=True
+            ))
+        db.session.flush()
+        for n in range(POSTS):
+            db.session.add(Post(title=f"post {n}", content="load test", user_id=1))
+        db.session.commit()
+
+
+def worker(args):
+    n, db_path, pragmas, busy_timeout, requests, start_at = args
+    _configure(db_path, pragmas, busy_timeout)
+    from flaskblog import create_app
+
+    app = create_app({"RATELIMIT_BACKEND": "none"})
+    app.config["WTF_CSRF_ENABLED"] = False
+    client = app.test_client()
+    client.post("/login", data={"email": f"writer{n}@example.com", "password": PASSWORD})
+
+    rng = random.Random(n)
+    failures = 0
+    latencies = []
+    while time.time() < start_at:
+        time.sleep(0.001)
+    for _ in range(requests):
+        post_id = rng.randint(1, POSTS)
+        started = time.perf_counter()
+        if rng.random() < 0.5:
+            response = client.post(f"/post/{post_id}/like", follow_redirects=True)
+        else:
+            response = client.post(
+                f"/post/{post_id}/comment", data={"content": "load"}, follow_redirects=True
+            )
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 500:
+            failures += 1
+    return failures, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--no-pragmas", action="store_true",
+                        help="skip WAL/busy_timeout/synchronous pragmas")
+    parser.add_argument("--busy-timeout", type=int, default=None,
+                        help="DB_SQLITE_BUSY_TIMEOUT in ms")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "writes.db")
+    pragmas = not args.no_pragmas
+    _configure(db_path, pragmas, args.busy_timeout)
+    seed(args.workers)
+
+    # spawn: every worker imports the app fresh, with its own engine and pool
+    ctx = multiprocessing.get_context("spawn")
+    start_at = time.time() + 3
+    jobs = [
+        (n, db_path, pragmas, args.busy_timeout, args.requests, start_at)
+        for n in range(args.workers)
+    ]
+    with ctx.Pool(args.workers) as pool:
+        results = pool.map(worker, jobs)
+    elapsed = time.time() - start_at
+
+    failures = sum(f for f, _ in results)
+    latencies = sorted(l for _, ls in results for l in ls)
+    total = len(latencies)
+    p50 = latencies[total // 2] * 1000
+    p99 = latencies[min(total - 1, int(total * 0.99))] * 1000
+
+    print(f"pragmas: {'on' if pragmas else 'off'}  workers: {args.workers}")
+    print(f"requests: {total}  failed: {failures}  ({failures / total:.1%})")
+    print(f"throughput: {total / elapsed:.0f} req/s  p50: {p50:.1f} ms  p99: {p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Measure cold-start cost: importing flaskblog and building the app.
+
+Each sample runs in a fresh interpreter, which is what a new gunicorn
+worker or an autoscaled instance pays. Also lists the slowest imports
+(python -X importtime) and checks that modules only some requests need
+are not loaded at start-up.
+
+    python benchmarks/import_time.py --samples 7 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported lazily: Pillow on upload, psycopg only for Postgres URLs,
+# Alembic only for "flask db"
+LAZY_MODULES = ("PIL", "psycopg", "alembic", "flask_migrate")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import flaskblog
+imported = time.perf_counter()
+flaskblog.create_app()
+created = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "loaded": [m for m in %r if m in sys.modules],
+}))
+""" % (LAZY_MODULES,)
+
+
+def _env():
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", "benchmark")
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "cold.db"))
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def sample():
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], env=_env(), cwd=ROOT,
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports(top):
+    err = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import flaskblog; flaskblog.create_app()"],
+        env=_env(), cwd=ROOT, check=True, capture_output=True, text=True
+    ).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # nesting is two spaces per level; the probe's own imports and
+        # what they import directly are enough to see where time goes
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            rows.append((int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    sample()  # warm the bytecode cache, it is not part of a cold start
+    runs = [sample() for _ in range(args.samples)]
+    imports = [run["import_ms"] for run in runs]
+    creates = [run["create_app_ms"] for run in runs]
+    print(f"samples: {args.samples}")
+    print(f"import flaskblog : median {statistics.median(imports):7.1f} ms  "
+          f"min {min(imports):7.1f} ms")
+    print(f"create_app()     : median {statistics.median(creates):7.1f} ms  "
+          f"min {min(creates):7.1f} ms")
+
+    loaded = runs[-1]["loaded"]
+    print(f"lazy modules loaded at start-up: {', '.join(loaded) if loaded else 'none'}")
+
+    print("\nslowest imports, two levels deep (cumulative):")
+    for cumulative_us, name in slowest_imports(args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare the direct like path with the write-behind buffer.
+
+Several client threads toggle likes on a handful of hot posts through
+like_post(). For each mode this reports requests/sec, how many write
+transactions reached the database, and checks afterwards that
+Post.like_count still matches the post_like rows.
+
+    python benchmarks/like_write_behind.py --threads 8 --requests 300
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_db_dir, "likes_bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ["BCRYPT_LOG_ROUNDS"] = "4"
+
+from sqlalchemy import event, func, select  # noqa: E402
+
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.likebuffer import like_buffer  # noqa: E402
+from flaskblog.models import User, Post, PostLike  # noqa: E402
+from flaskblog.passwords import hash_password  # noqa: E402
+
+app = create_app({"RATELIMIT_BACKEND": "none"})
+
+HOT_POSTS = 5
+PASSWORD = "benchmark-password"
+
+
+class WriteCounter:
+    """Counts commits of transactions that executed INSERT/UPDATE/DELETE."""
+
+    def __init__(self, engine):
+        self.commits = 0
+        self._dirty = set()
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._commit)
+
+    def _statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self._dirty.add(id(conn.connection.dbapi_connection))
+
+    def _commit(self, conn):
+        key = id(conn.connection.dbapi_connection)
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self.commits += 1
+
+
+def seed(users):
+    with app.app_context():
+        db.create_all()
+        password = hash_password(PASSWORD)
+        for n in range(users):
+            db.session.add(User(
+                username=f"liker{n}", email=f"liker{n}@example.com",
+                password=password, verified=True
+            ))
+        db.session.flush()
+        for n in range(HOT_POSTS):
+            db.session.add(Post(title=f"hot {n}", content="benchmark", user_id=1))
+        db.session.commit()
+
+
+def client_for(n):
+    client = app.test_client()
+    client.post("/login", data={"email": f"liker{n}@example.com", "password": PASSWORD})
+    return client
+
+
+def hammer(client, seed_value, requests):
+    rng = random.Random(seed_value)
+    for _ in range(requests):
+        client.post(f"/post/{rng.randint(1, HOT_POSTS)}/like")
+
+
+def counters_consistent():
+    with app.app_context():
+        stored = dict(db.session.execute(select(Post.id, Post.like_count)).all())
+        actual = dict(db.session.execute(
+            select(PostLike.post_id, func.count()).group_by(PostLike.post_id)
+        ).all())
+        return all(stored[pid] == actual.get(pid, 0) for pid in stored)
+
+
+def run(mode, clients, requests, counter):
+    app.config["LIKE_WRITE_BEHIND"] = mode == "write-behind"
+    counter.commits = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        list(pool.map(hammer, clients, range(len(clients)), [requests] * len(clients)))
+    elapsed = time.perf_counter() - start
+    with app.app_context():
+        like_buffer.flush()
+    total = requests * len(clients)
+    print(f"{mode:>12} {total / elapsed:>9.0f} {counter.commits:>9} "
+          f"{counter.commits / elapsed:>10.1f} {str(counters_consistent()):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+
+    app.config["WTF_CSRF_ENABLED"] = False
+    seed(args.threads)
+    clients = [client_for(n) for n in range(args.threads)]
+    with app.app_context():
+        counter = WriteCounter(db.engine)
+
+    print(f"{'mode':>12} {'req/s':>9} {'commits':>9} {'commits/s':>10} {'counters':>10}")
+    run("direct", clients, args.requests, counter)
+    run("write-behind", clients, args.requests, counter)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Measure what rate limiting adds to a request.
+
+First the backends alone: hit() latency per algorithm for the memory
+backend and the shared backend (the in-memory stand-in, or a real
+server with --redis-url), from several threads over many client keys.
+Then whole requests: the same trivial POST view with and without
+@rate_limit through the test client; the difference is the overhead a
+limited view pays. Exits 1 when that median overhead is over --budget-ms.
+
+    python benchmarks/rate_limit_benchmark.py --threads 1 4 --hits 20000
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from flaskblog import create_app  # noqa: E402
+from flaskblog.ratelimit import (  # noqa: E402
+    ALGORITHMS, MemoryBackend, SharedBackend, StandInClient, by_ip, rate_limit
+)
+
+# high enough that no benchmark hit is refused
+LIMIT = "1000000/minute"
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def backend_latencies(backend, hits, threads, keys):
+    limit, period = 1000000, 60.0
+    per_thread = hits // threads
+
+    def run(offset):
+        samples = []
+        for n in range(per_thread):
+            key = f"bench:ip:{(offset + n) % keys}"
+            start = time.perf_counter()
+            backend.hit(key, limit, period)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        samples = [s for batch in pool.map(run, range(0, threads * 7919, 7919)) for s in batch]
+    return samples, len(samples) / (time.perf_counter() - started)
+
+
+def make_backends(algorithm, redis_url, keys):
+    backends = {
+        "memory": MemoryBackend(algorithm, max_keys=keys * 2),
+        "shared (stand-in)": SharedBackend(StandInClient(), algorithm),
+    }
+    if redis_url:
+        import redis
+        backends["shared (redis)"] = SharedBackend(redis.Redis.from_url(redis_url), algorithm)
+    return backends
+
+
+def request_overhead(strategy, requests):
+    """Median/p99 seconds per POST for a limited and an unlimited view."""
+    app = create_app({"RATELIMIT_BACKEND": "memory", "RATELIMIT_STRATEGY": strategy,
+                      "RATELIMIT_BENCH": LIMIT, "METRICS_ENABLED": False})
+
+    def plain():
+        return "ok"
+
+    app.add_url_rule("/bench/plain", "bench_plain", plain, methods=["POST"])
+    app.add_url_rule("/bench/limited", "bench_limited", rate_limit("bench", by_ip)(plain),
+                     methods=["POST"])
+    client = app.test_client()
+
+    results = {}
+    for path in ("/bench/plain", "/bench/limited"):
+        samples = []
+        for n in range(requests):
+            # a new client address every time, the worst case for the key store
+            environ = {"REMOTE_ADDR": f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"}
+            start = time.perf_counter()
+            response = client.post(path, environ_base=environ)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                sys.exit(f"{path} answered {response.status_code}")
+        results[path] = samples
+    return results["/bench/plain"], results["/bench/limited"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--strategy", nargs="+", default=sorted(ALGORITHMS), choices=sorted(ALGORITHMS))
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--hits", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=10000, help="distinct clients")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--redis-url", help="also measure a real shared backend")
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'strategy':<15} {'backend':<18} {'threads':>7} {'hits/s':>10} "
+          f"{'p50 us':>8} {'p99 us':>8}")
+    for strategy in args.strategy:
+        for name, backend in make_backends(ALGORITHMS[strategy], args.redis_url, args.keys).items():
+            for threads in args.threads:
+                samples, rate = backend_latencies(backend, args.hits, threads, args.keys)
+                print(f"{strategy:<15} {name:<18} {threads:>7} {rate:>10.0f} "
+                      f"{percentile(samples, 0.5) * 1e6:>8.1f} {percentile(samples, 0.99) * 1e6:>8.1f}")
+
+    print()
+    failed = False
+    for strategy in args.strategy:
+        plain, limited = request_overhead(strategy, args.requests)
+        overhead = statistics.median(limited) - statistics.median(plain)
+        print(f"{strategy:<15} POST median {statistics.median(plain) * 1e3:.3f} ms -> "
+              f"{statistics.median(limited) * 1e3:.3f} ms limited, "
+              f"overhead {overhead * 1e3:.3f} ms "
+              f"(p99 {percentile(plain, 0.99) * 1e3:.3f} -> {percentile(limited, 0.99) * 1e3:.3f} ms)")
+        failed |= overhead * 1e3 > args.budget_ms
+    if failed:
+        sys.exit(f"rate limiting costs more than {args.budget_ms} ms per request")
+
+
+if __name__ == "__main__":
+    main()
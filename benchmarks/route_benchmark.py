@@ -0,0 +1,389 @@
+"""Reproducible load test for the main blog routes.
+
+Seeds a fresh database at a chosen scale with flaskblog.seeding (users,
+posts built from posts.json, likes and threaded comments; everything
+drawn from one --seed), then measures throughput and p50/p99 latency of home, post,
+user_posts, like_post and add_comment. Requests go either through the
+Flask test client (app cost only) or over HTTP to a local threaded WSGI
+server (adds the HTTP stack). Results are written as JSON, together with
+the git commit and the settings, so runs can be compared across commits:
+
+    python benchmarks/route_benchmark.py --scale medium --output before.json
+    git checkout my-branch
+    python benchmarks/route_benchmark.py --scale medium --output after.json
+    python benchmarks/route_benchmark.py --compare before.json after.json
+
+With a single --compare file the benchmark runs first and is compared
+against it; --fail-over 10 exits non-zero if any p50 got more than 10%
+slower. Reads are anonymous by default, so the page cache is in play;
+--reads-as user measures the uncached, logged-in path.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import http.client
+from http.cookies import SimpleCookie
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+os.environ.setdefault("MAIL_QUEUE_BACKEND", "sync")
+
+SCALES = {
+    # users, posts, likes per post, comments per post
+    "small": (50, 500, 5, 4),
+    "medium": (500, 5000, 10, 8),
+    "large": (5000, 50000, 20, 12),
+}
+ROUTES = ("home", "post", "user_posts", "like_post", "add_comment")
+PASSWORD = "benchmark-password"
+# share of add_comment requests that reply to an existing comment
+REPLY_RATIO = 0.4
+# posts per commit while seeding
+CHUNK = 2000
+
+
+# =====================================================
+# SEEDING
+# =====================================================
+def seed(app, users, posts, likes_per_post, comments_per_post, seed_value):
+    """Fill an empty database. Returns what the workload needs to know."""
+    from sqlalchemy import select
+
+    from flaskblog import db
+    from flaskblog.models import Comment
+    from flaskblog.seeding import synthesize
+
+    with app.app_context():
+        db.create_all()
+        counts = synthesize(users, posts, likes_per_post, comments_per_post,
+                            seed=seed_value, chunk_size=CHUNK, password=PASSWORD)
+        comments_by_post = {}
+        for post_id, comment_id in db.session.execute(
+            select(Comment.post_id, Comment.id).order_by(Comment.id)
+        ):
+            comments_by_post.setdefault(post_id, []).append(comment_id)
+
+    return dict(counts, comments_by_post=comments_by_post)
+
+
+# =====================================================
+# WORKLOAD
+# =====================================================
+def workload(route, data, rng, count):
+    """Fixed list of (method, path, form) for one route."""
+    posts = data["posts"]
+    threaded = sorted(data["comments_by_post"])
+    requests = []
+    for _ in range(count):
+        post_id = rng.randint(1, posts)
+        if route == "home":
+            requests.append(("GET", f"/home?page={rng.randint(1, 5)}", None))
+        elif route == "post":
+            requests.append(("GET", f"/post/{post_id}", None))
+        elif route == "user_posts":
+            requests.append(("GET", f"/user/user{rng.randint(1, data['users'])}", None))
+        elif route == "like_post":
+            requests.append(("POST", f"/post/{post_id}/like", {}))
+        elif route == "add_comment":
+            form = {"content": "benchmark comment"}
+            if threaded and rng.random() < REPLY_RATIO:
+                post_id = rng.choice(threaded)
+                form["parent_id"] = str(rng.choice(data["comments_by_post"][post_id]))
+            requests.append(("POST", f"/post/{post_id}/comment", form))
+    return requests
+
+
+def _ok(status):
+    # writes answer with a redirect back to the post
+    return status < 400
+
+
+# ---------------- DRIVERS ----------------
+class ClientDriver:
+    """Flask test client: no sockets, measures the app alone."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def session(self, user_id):
+        client = self.app.test_client()
+        if user_id is not None:
+            client.post("/login", data={"email": f"user{user_id}@example.com", "password": PASSWORD})
+
+        def send(method, path, form):
+            return client.open(path, method=method, data=form).status_code
+
+        return send
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    """Real HTTP against a threaded werkzeug server on a free local port."""
+
+    def __init__(self, app):
+        from werkzeug.serving import make_server
+
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        self.server = make_server("127.0.0.1", 0, app, threaded=True)
+        self.port = self.server.server_port
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def session(self, user_id):
+        cookies = {}
+
+        def send(method, path, form):
+            headers = {}
+            body = None
+            if form is not None:
+                body = urlencode(form)
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+            if cookies:
+                headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+            conn = http.client.HTTPConnection("127.0.0.1", self.port)
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            finally:
+                conn.close()
+            for header in response.headers.get_all("Set-Cookie") or ():
+                for name, morsel in SimpleCookie(header).items():
+                    cookies[name] = morsel.value
+            return response.status
+
+        if user_id is not None:
+            send("POST", "/login", {"email": f"user{user_id}@example.com", "password": PASSWORD})
+        return send
+
+    def close(self):
+        self.server.shutdown()
+
+
+# ---------------- MEASURING ----------------
+def measure(driver, route, requests, concurrency, warmup, logged_in):
+    """Run ``requests`` over ``concurrency`` sessions, one user each."""
+    sessions = [driver.session(n + 1 if logged_in else None) for n in range(concurrency)]
+    for i, (method, path, form) in enumerate(requests[:warmup]):
+        sessions[i % concurrency](method, path, form)
+    measured = requests[warmup:]
+
+    def run(n):
+        send = sessions[n]
+        timings, errors = [], 0
+        for method, path, form in measured[n::concurrency]:
+            start = time.perf_counter()
+            status = send(method, path, form)
+            timings.append(time.perf_counter() - start)
+            errors += not _ok(status)
+        return timings, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    timings = sorted(t for timing, _ in results for t in timing)
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "route": route,
+        "requests": len(timings),
+        "errors": sum(errors for _, errors in results),
+        "seconds": round(elapsed, 4),
+        "rps": round(len(timings) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 3),
+        "p50_ms": round(statistics.median(timings) * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "max_ms": round(timings[-1] * 1000, 3),
+    }
+
+
+def counter_drift(app):
+    from flaskblog.counters import reconcile_counters
+    from flaskblog.likebuffer import like_buffer
+
+    with app.app_context():
+        like_buffer.flush()
+        return reconcile_counters()
+
+
+# =====================================================
+# RESULTS
+# =====================================================
+def _git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args, database_url):
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": database_url.split(":", 1)[0],
+        "driver": args.driver,
+        "scale": args.scale,
+        "seed": args.seed,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "reads_as": args.reads_as,
+    }
+
+
+def print_results(results):
+    print(f"{'route':>12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for row in results:
+        print(f"{row['route']:>12} {row['rps']:>9.1f} {row['p50_ms']:>9.2f} "
+              f"{row['p99_ms']:>9.2f} {row['max_ms']:>9.2f} {row['errors']:>7}")
+
+
+def compare(base, new, fail_over):
+    """Print per-route changes. Returns False if a p50 regressed past fail_over %."""
+    print(f"base {base['env']['commit'] or '?'} -> new {new['env']['commit'] or '?'}")
+    for key in ("driver", "scale", "seed", "requests", "concurrency", "database"):
+        if base["env"].get(key) != new["env"].get(key):
+            print(f"warning: runs differ in {key}: "
+                  f"{base['env'].get(key)} vs {new['env'].get(key)}")
+
+    before = {row["route"]: row for row in base["results"]}
+    passed = True
+    print(f"{'route':>12} {'req/s':>18} {'p50 ms':>22} {'p99 ms':>22}")
+    for row in new["results"]:
+        old = before.get(row["route"])
+        if old is None:
+            continue
+        change = {
+            key: (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            for key in ("rps", "p50_ms", "p99_ms")
+        }
+        print(f"{row['route']:>12} "
+              f"{old['rps']:>8.1f} {change['rps']:>+8.1f}% "
+              f"{old['p50_ms']:>8.2f} -> {row['p50_ms']:<6.2f} {change['p50_ms']:>+5.0f}% "
+              f"{old['p99_ms']:>8.2f} -> {row['p99_ms']:<6.2f} {change['p99_ms']:>+5.0f}%")
+        if fail_over is not None and change["p50_ms"] > fail_over:
+            passed = False
+    return passed
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# =====================================================
+# MAIN
+# =====================================================
+def run(args):
+    users, posts, likes_per_post, comments_per_post = SCALES[args.scale]
+    users = args.users or users
+    posts = args.posts or posts
+
+    database_url = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "routes.db")
+    os.environ["DATABASE_URL"] = database_url
+
+    from flaskblog import create_app
+
+    # every request comes from one address and a handful of users; the
+    # limiter's own cost is measured by rate_limit_benchmark.py.
+    # A view over its @query_budget fails the request, so an N+1
+    # regression shows up as errors and fails the run (and CI).
+    app = create_app({"WTF_CSRF_ENABLED": False, "RATELIMIT_BACKEND": "none",
+                      "QUERY_BUDGET_ENFORCE": True})
+    if args.concurrency > users:
+        sys.exit("--concurrency cannot exceed the number of seeded users")
+
+    started = time.perf_counter()
+    data = seed(app, users, posts, likes_per_post, comments_per_post, args.seed)
+    seeded = {key: value for key, value in data.items() if key != "comments_by_post"}
+    print(f"seeded {seeded} in {time.perf_counter() - started:.1f}s ({args.driver} driver)")
+
+    driver = ClientDriver(app) if args.driver == "client" else ServerDriver(app)
+    results = []
+    try:
+        for route in args.routes:
+            requests = workload(route, data, random.Random(f"{args.seed}:{route}"),
+                                args.warmup + args.requests)
+            logged_in = route in ("like_post", "add_comment") or args.reads_as == "user"
+            results.append(measure(driver, route, requests, args.concurrency, args.warmup, logged_in))
+    finally:
+        driver.close()
+
+    report = {
+        "env": environment(args, database_url),
+        "seeded": seeded,
+        "results": results,
+        "counter_drift": counter_drift(app),
+    }
+    print_results(results)
+    print(f"counter drift after run: {report['counter_drift']} posts")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--users", type=int, help="override the scale's user count")
+    parser.add_argument("--posts", type=int, help="override the scale's post count")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--driver", choices=("client", "server"), default="client")
+    parser.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES))
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--reads-as", choices=("anonymous", "user"), default="anonymous")
+    parser.add_argument("--database-url", help="empty database to seed (default: temp SQLite)")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", nargs="+", metavar="JSON",
+                        help="BASE [NEW]: compare NEW (or this run) against BASE")
+    parser.add_argument("--fail-over", type=float, metavar="PCT",
+                        help="with --compare, exit 1 if any p50 is PCT%% slower")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes BASE or BASE NEW")
+    if args.compare and len(args.compare) == 2:
+        report = load(args.compare[1])
+    else:
+        report = run(args)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"wrote {args.output}")
+
+    failed = report["counter_drift"] != 0 or any(row["errors"] for row in report["results"])
+    if args.compare:
+        print()
+        failed |= not compare(load(args.compare[0]), report, args.fail_over)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
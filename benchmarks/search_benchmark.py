@@ -0,0 +1,89 @@
+"""Compare indexed full-text search against a LIKE '%q%' scan.
+
+Seeds a throwaway SQLite database at several sizes (posts.json as
+templates, plus a rare "markerNx" token per post) and times the ranked
+FTS5 lookup behind search_posts() versus a plain LIKE scan.
+
+    python benchmarks/search_benchmark.py --sizes 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_db_dir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_db_dir, "search_bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from sqlalchemy import text  # noqa: E402
+
+from flaskblog import create_app, db  # noqa: E402
+from flaskblog.models import User, Post  # noqa: E402
+from flaskblog.search import _ranked_ids, rebuild_search_index  # noqa: E402
+
+app = create_app()
+
+
+def seed(total, templates):
+    rng = random.Random(total)
+    existing = Post.query.count()
+    rows = [
+        {
+            "title": rng.choice(templates)["title"],
+            "content": rng.choice(templates)["content"] + f" marker{rng.randrange(total)}x",
+            "user_id": 1,
+        }
+        for _ in range(total - existing)
+    ]
+    if rows:
+        db.session.execute(Post.__table__.insert(), rows)
+        db.session.commit()
+    rebuild_search_index()
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--query", default="marker42x")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, "posts.json")) as f:
+        templates = json.load(f)
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="bench", email="bench@example.com", password="x"))
+        db.session.commit()
+
+        like_sql = text(
+            "SELECT id FROM post WHERE title LIKE :q OR content LIKE :q "
+            "ORDER BY date_posted DESC LIMIT 6"
+        )
+
+        print(f"{'posts':>8} {'fts ms':>10} {'like ms':>10} {'speedup':>8}")
+        for size in sorted(args.sizes):
+            seed(size, templates)
+            fts_ms = timed(lambda: _ranked_ids(args.query, 6, 0), args.repeat)
+            like_ms = timed(
+                lambda: db.session.execute(like_sql, {"q": f"%{args.query}%"}).all(),
+                args.repeat
+            )
+            print(f"{size:>8} {fts_ms:>10.3f} {like_ms:>10.3f} {like_ms / fts_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
-from flaskblog import app, db  # Replace 'flaskblog' with your Flask application name
+from flaskblog import create_app, db  # Replace 'flaskblog' with your Flask application name
 from flaskblog.models import User, Post, PasswordHistory  # Import your models
 from tabulate import tabulate  # For displaying data in table format
 from sqlalchemy.orm import class_mapper
 import sys
 
+app = create_app()
+
 # Function to fetch entries from a table
 def fetch_table_entries(model):
     entries = model.query.all()
@@ -3,108 +3,79 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_mail import Mail
-from flask_migrate import Migrate
 
 from dotenv import load_dotenv
-import os
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from flaskblog.database import RoutingSession
 
 # =====================================================
-# LOAD ENVIRONMENT VARIABLES
+# EXTENSIONS
+# Created unbound at import time and attached to an
+# application by create_app(), so importing flaskblog
+# stays cheap and tests can build as many apps as they
+# like.
 # =====================================================
 
-load_dotenv()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
-# =====================================================
-# CREATE FLASK APPLICATION
-# =====================================================
+bcrypt = Bcrypt()
 
-app = Flask(__name__)
+login_manager = LoginManager()
 
-# =====================================================
-# SECURITY CONFIGURATION
-# =====================================================
+login_manager.login_view = "main.login"
 
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+login_manager.login_message_category = "info"
 
-app.config["SECURITY_PASSWORD_SALT"] = os.getenv(
-    "SECURITY_PASSWORD_SALT",
-    "my_precious_two"
-)
+mail = Mail()
 
 # =====================================================
-# DATABASE CONFIGURATION
-# CURRENT:
-# SQLite Local Database
+# APPLICATION FACTORY
 #
-# FUTURE:
-# Neon PostgreSQL
+# gunicorn "flaskblog:create_app()"
+# flask --app flaskblog run
 #
-# Only .env changes needed later
-# =====================================================
-
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
-    "DATABASE_URL",
-    "sqlite:///site.db"
-)
-
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# =====================================================
-# MAIL CONFIGURATION
+# config: dict of overrides applied after the
+# environment (.env) has been read.
 # =====================================================
 
-app.config["MAIL_SERVER"] = "smtp.gmail.com"
-
-app.config["MAIL_PORT"] = 587
 
-app.config["MAIL_USE_TLS"] = True
+def create_app(config=None):
+    load_dotenv()
 
-app.config["MAIL_USE_SSL"] = False
+    app = Flask(__name__)
 
-app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
+    from flaskblog.config import load_config
+    load_config(app, config)
 
-app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
+    if app.config["PROXY_FIX_X_FOR"]:
+        # trust only that many X-Forwarded-For entries, a client can
+        # prepend its own
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_FIX_X_FOR"])
 
-app.config["MAIL_DEFAULT_SENDER"] = os.getenv(
-    "MAIL_USERNAME"
-)
+    db.init_app(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+    mail.init_app(app)
 
-# =====================================================
-# DATABASE OBJECT
-# =====================================================
-
-db = SQLAlchemy(app)
-
-# =====================================================
-# DATABASE MIGRATIONS
-# =====================================================
+    # models and the user loader register themselves on import
+    from flaskblog import models, usercache  # noqa: F401
+    from flaskblog import fragments, images, likebuffer, mailqueue
+    from flaskblog import metrics, pagination, profiler, ratelimit
+    usercache.init_app(app)
+    fragments.init_app(app)
+    images.init_app(app)
+    likebuffer.init_app(app)
+    mailqueue.init_app(app)
+    pagination.init_app(app)
+    metrics.init_app(app)
+    profiler.init_app(app)
+    ratelimit.init_app(app)
 
-migrate = Migrate(app, db)
+    from flaskblog.routes import bp as main_bp
+    from flaskblog.commands import bp as commands_bp
+    app.register_blueprint(main_bp)
+    app.register_blueprint(commands_bp)
 
-# =====================================================
-# PASSWORD HASHING
-# =====================================================
-
-bcrypt = Bcrypt(app)
-
-# =====================================================
-# LOGIN MANAGER
-# =====================================================
-
-login_manager = LoginManager(app)
-
-login_manager.login_view = "login"
-
-login_manager.login_message_category = "info"
-
-# =====================================================
-# EMAIL OBJECT
-# =====================================================
-
-mail = Mail(app)
-
-# =====================================================
-# IMPORT ROUTES
-# =====================================================
+    return app
 
-from flaskblog import routes
\ No newline at end of file
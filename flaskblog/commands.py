@@ -0,0 +1,266 @@
+import time
+
+import click
+from flask import Blueprint, current_app
+
+from flaskblog import db
+from flaskblog.counters import reconcile_counters
+from flaskblog.search import rebuild_search_index
+from flaskblog.mailqueue import mail_queue
+from flaskblog.models import PasswordHistory
+from flaskblog.mailsink import MailSink
+from flaskblog.images import unreferenced_pictures, collect_orphans
+from flaskblog.profiler import make_token
+from flaskblog.seeding import DEFAULT_CHUNK, RecordError, import_posts, read_records, synthesize
+from flaskblog.transfer import DEFAULT_BATCH, FORMATS, TransferError, export_tables, import_tables
+
+# =====================================================
+# CLI COMMANDS
+# flask db ...  (Flask-Migrate, loaded on first use)
+# flask reconcile-counters
+# flask search-reindex
+# flask mail-worker
+# flask mail-sink
+# flask gc-profile-pics
+# flask replica-sync
+# flask profile-token
+# flask import-posts
+# flask seed
+# flask export / flask import-data
+# flask check-query-plans
+# flask prune-password-history
+# =====================================================
+
+# cli_group=None: commands sit at the top level (flask search-reindex)
+bp = Blueprint("commands", __name__, cli_group=None)
+
+
+class LazyMigrateGroup(click.Group):
+    """``flask db``: Flask-Migrate imports all of Alembic (~0.2s), so it
+    is only set up once a "flask db ..." command actually runs."""
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as migrate_cli
+
+        if "migrate" not in current_app.extensions:
+            Migrate(current_app, db)
+        return migrate_cli.make_context(info_name, args, parent=parent, **extra)
+
+
+bp.cli.add_command(LazyMigrateGroup("db", help="Perform database migrations."))
+
+
+@bp.cli.command("reconcile-counters")
+def reconcile_counters_command():
+    """Repair drift in Post.like_count / Post.comment_count."""
+    fixed = reconcile_counters()
+    click.echo(f"Reconciled counters on {fixed} post(s).")
+
+
+@bp.cli.command("search-reindex")
+def search_reindex_command():
+    """Rebuild the full-text search index from the post table."""
+    rebuild_search_index()
+    click.echo("Search index rebuilt.")
+
+
+@bp.cli.command("mail-worker")
+def mail_worker_command():
+    """Run the mail queue workers in the foreground (outbox deployments)."""
+    mail_queue.start()
+    click.echo(f"Mail workers running ({current_app.config['MAIL_QUEUE_BACKEND']}).")
+    while True:
+        time.sleep(60)
+
+
+@bp.cli.command("mail-sink")
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=1025, type=int)
+def mail_sink_command(host, port):
+    """Run a local fake SMTP server that prints every message it receives."""
+    sink = MailSink(host, port).start()
+    click.echo(f"Mail sink listening on {host}:{sink.port}")
+    seen = 0
+    while True:
+        time.sleep(0.5)
+        for message in sink.messages[seen:]:
+            click.echo(f"--- To: {message['To']} | {message['Subject']}")
+            click.echo((message.get_payload(decode=True) or b"").decode("utf-8", "replace"))
+        seen = len(sink.messages)
+
+
+@bp.cli.command("gc-profile-pics")
+@click.option("--delete", is_flag=True, help="Remove the files instead of listing them.")
+def gc_profile_pics_command(delete):
+    """List (or delete) profile pictures no user references."""
+    orphans = unreferenced_pictures()
+    for name in orphans:
+        click.echo(name)
+    if delete:
+        removed = collect_orphans(orphans)
+        click.echo(f"Removed {len(removed)} file(s).")
+    else:
+        click.echo(f"{len(orphans)} unreferenced picture(s). Re-run with --delete to remove.")
+
+
+@bp.cli.command("replica-sync")
+def replica_sync_command():
+    """Copy the primary SQLite database onto the SQLite replica (local testing)."""
+    if "replica" not in db.engines:
+        raise click.ClickException("DATABASE_READ_URL is not set.")
+    primary, replica = db.engines[None], db.engines["replica"]
+    if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+        raise click.ClickException("replica-sync only copies SQLite files; use real replication.")
+
+    replica.dispose()
+    source = primary.raw_connection()
+    target = replica.raw_connection()
+    try:
+        source.driver_connection.backup(target.driver_connection)
+    finally:
+        target.close()
+        source.close()
+    click.echo(f"Copied {primary.url.database} -> {replica.url.database}")
+
+
+@bp.cli.command("profile-token")
+@click.option("--endpoint", default=None, help="Only profile this endpoint, e.g. main.home.")
+def profile_token_command(endpoint):
+    """Print a signed token that turns on the request profiler."""
+    if not current_app.config["PROFILE_DIR"]:
+        click.echo("Warning: PROFILE_DIR is not set, the profiler is off.", err=True)
+    token = make_token(endpoint)
+    hours = current_app.config["PROFILE_TOKEN_MAX_AGE"] / 3600
+    click.echo(token)
+    click.echo(f"Send it as X-Profile-Token or ?_profile=... (valid {hours:g}h)", err=True)
+
+
+@bp.cli.command("import-posts")
+@click.argument("source", type=click.File("r", encoding="utf-8"), default="posts.json")
+@click.option("--format", "fmt", type=click.Choice(["auto", "json", "jsonl"]), default="auto",
+              help="JSON array or JSON Lines (auto: look at the first character).")
+@click.option("--author", default=None, help="Username that gets every imported post.")
+@click.option("--chunk-size", default=DEFAULT_CHUNK, type=click.IntRange(1),
+              help="Posts per INSERT and per commit.")
+@click.option("--skip-invalid", is_flag=True, help="Report bad records and carry on.")
+def import_posts_command(source, fmt, author, chunk_size, skip_invalid):
+    """Bulk-load posts from SOURCE (default posts.json, "-" for stdin)."""
+    from flaskblog.models import User
+
+    user_id = None
+    if author is not None:
+        user_id = db.session.scalar(db.select(User.id).filter_by(username=author))
+        if user_id is None:
+            raise click.ClickException(f"No user named {author!r}.")
+
+    try:
+        imported, skipped = import_posts(
+            read_records(source, fmt), user_id=user_id,
+            chunk_size=chunk_size, skip_invalid=skip_invalid
+        )
+    except RecordError as error:
+        raise click.ClickException(
+            f"{error} (posts before record {error.number} were imported, "
+            f"in chunks of {chunk_size}; use --skip-invalid to carry on)"
+        )
+    for error in skipped:
+        click.echo(f"skipped {error}", err=True)
+    click.echo(f"Imported {imported} post(s), skipped {len(skipped)}.")
+
+
+@bp.cli.command("seed")
+@click.option("--users", default=100, type=click.IntRange(0))
+@click.option("--posts", default=1000, type=click.IntRange(0))
+@click.option("--likes-per-post", default=5, type=click.IntRange(0), help="Average.")
+@click.option("--comments-per-post", default=4, type=click.IntRange(0), help="Average.")
+@click.option("--seed", "seed_value", default=0, type=int, help="Random seed.")
+@click.option("--chunk-size", default=DEFAULT_CHUNK, type=click.IntRange(1),
+              help="Posts (with their likes and comments) per commit.")
+@click.option("--password", default="password", help="Password of every synthetic user.")
+def seed_command(users, posts, likes_per_post, comments_per_post, seed_value, chunk_size, password):
+    """Generate synthetic users, posts, likes and comments for load testing."""
+    if posts and not users:
+        raise click.ClickException("--posts needs --users to author them.")
+    started = time.perf_counter()
+
+    def progress(counts):
+        click.echo(f"\r{counts['users']} users, {counts['posts']} posts, "
+                   f"{counts['likes']} likes, {counts['comments']} comments", nl=False)
+
+    counts = synthesize(
+        users, posts, likes_per_post, comments_per_post, seed=seed_value,
+        chunk_size=chunk_size, password=password, progress=progress
+    )
+    click.echo(f"\nSeeded {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s. "
+               f"Users are user<id>@example.com / {password!r}.")
+
+
+def _transfer_progress(table, rows):
+    click.echo(f"\r{table}: {rows} rows", nl=False)
+
+
+@bp.cli.command("export")
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="jsonl")
+@click.option("--table", "tables", multiple=True, help="Only this table (repeatable).")
+@click.option("--batch-size", default=DEFAULT_BATCH, type=click.IntRange(1),
+              help="Rows per fetch and per checkpoint.")
+@click.option("--resume", is_flag=True, help="Continue an interrupted export from its checkpoint.")
+def export_command(directory, fmt, tables, batch_size, resume):
+    """Stream tables to DIRECTORY as JSON Lines, CSV or Parquet."""
+    try:
+        written = export_tables(directory, fmt, tables, batch_size, resume, _transfer_progress)
+    except TransferError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"\nExported {sum(written.values())} row(s) to {directory}: "
+               + ", ".join(f"{name} {rows}" for name, rows in written.items()))
+
+
+@bp.cli.command("import-data")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None,
+              help="Defaults to the format the export was written in.")
+@click.option("--table", "tables", multiple=True, help="Only this table (repeatable).")
+@click.option("--batch-size", default=DEFAULT_BATCH, type=click.IntRange(1),
+              help="Rows per INSERT and per commit.")
+@click.option("--resume", is_flag=True, help="Continue an interrupted import from its checkpoint.")
+def import_data_command(directory, fmt, tables, batch_size, resume):
+    """Load a "flask export" DIRECTORY into this database (ids are kept)."""
+    from sqlalchemy.exc import IntegrityError
+
+    try:
+        inserted = import_tables(directory, fmt, tables, batch_size, resume, _transfer_progress)
+    except TransferError as error:
+        raise click.ClickException(str(error))
+    except IntegrityError as error:
+        raise click.ClickException(
+            f"{error.orig} -- the target already holds some of these rows; "
+            "import into empty tables, or add --resume after an interrupted run."
+        )
+    click.echo(f"\nImported {sum(inserted.values())} row(s): "
+               + ", ".join(f"{name} {rows}" for name, rows in inserted.items()))
+
+
+@bp.cli.command("check-query-plans")
+def check_query_plans_command():
+    """Fail if a hot query reads a whole table instead of using an index."""
+    from flaskblog.queryplans import check_query_plans
+
+    try:
+        checked, problems = check_query_plans()
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+    for label, table, statement in problems:
+        click.echo(f"FULL SCAN of {table} in {label}:\n  {statement}\n")
+    click.echo(f"Checked {checked} statement(s), {len(problems)} full scan(s).")
+    if problems:
+        raise SystemExit(1)
+
+
+@bp.cli.command("prune-password-history")
+def prune_password_history_command():
+    """Delete password history beyond PASSWORD_HISTORY_SIZE per user."""
+    deleted = PasswordHistory.prune(current_app.config["PASSWORD_HISTORY_SIZE"])
+    db.session.commit()
+    click.echo(f"Deleted {deleted} password history row(s).")
@@ -0,0 +1,96 @@
+import hashlib
+
+from flask import make_response, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+from werkzeug.wrappers import Response
+
+# =====================================================
+# CONDITIONAL GET (ETag / Last-Modified)
+#
+# Views compute a cheap version tuple for what the page
+# shows (post ids + updated_at, author name/picture,
+# pagination state) and hand rendering over as a
+# callable. When the client's ETag still matches, a 304
+# goes back and the template is never rendered.
+#
+# Feed and post pages send only the ETag (see
+# feed_versions).
+# Anonymous pages are public and revalidated on every
+# use (CDN friendly); logged-in pages are private and
+# their ETag includes the user id.
+# =====================================================
+
+
+def make_etag(versions):
+    raw = repr((versions, current_user.get_id())).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()
+
+
+def respond(etag, last_modified, render):
+    personal = current_user.is_authenticated
+    if personal:
+        # a page rendered for one user says nothing about its age for another
+        last_modified = None
+
+    # pending flash messages have to be rendered, never short-circuit them
+    if not session.get("_flashes") and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    ):
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.vary.add("Cookie")
+    if personal:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.must_revalidate = True
+    return response
+
+
+def conditional(versions, last_modified, render):
+    """304 if the client already has this version, else the rendered page."""
+    return respond(make_etag(versions), last_modified, render)
+
+
+def post_versions(post):
+    return (post.id, post.updated_at, post.author.username, post.author.image_file)
+
+
+def feed_versions(posts):
+    """Version tuple for a page of posts (either pager).
+
+    Feeds get no Last-Modified: deleting a post or renaming an author
+    changes the page without moving any updated_at forward, so only the
+    ETag can tell.
+    """
+    items = tuple(post_versions(post) for post in posts.items)
+    pager = (
+        getattr(posts, "total", None),
+        getattr(posts, "pages", None),
+        getattr(posts, "older_cursor", None),
+        getattr(posts, "newer_cursor", None),
+    )
+    return items, pager
+
+
+def comment_versions(comments):
+    """Version tuple for a CommentThreadPage: each comment shown and its author."""
+    versions = []
+    nodes = list(comments.threads)
+    while nodes:
+        node = nodes.pop()
+        comment = node.comment
+        versions.append((
+            comment.id, node.reply_count,
+            comment.user.id, comment.user.username, comment.user.image_file
+        ))
+        nodes.extend(node.children)
+    return tuple(sorted(versions)), comments.has_next
@@ -0,0 +1,304 @@
+import os
+
+from flaskblog.database import engine_options
+
+
+def load_config(app, overrides=None):
+    """Fill app.config from the environment (.env), then ``overrides``."""
+
+    # =====================================================
+    # SECURITY CONFIGURATION
+    # =====================================================
+
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+
+    app.config["SECURITY_PASSWORD_SALT"] = os.getenv(
+        "SECURITY_PASSWORD_SALT",
+        "my_precious_two"
+    )
+
+    # =====================================================
+    # REVERSE PROXY
+    # PROXY_FIX_X_FOR: proxies in front of the app that set
+    # X-Forwarded-For (1 on Render). 0 trusts none, so the
+    # client address is the connecting one; rate limits are
+    # keyed on it.
+    # =====================================================
+
+    app.config["PROXY_FIX_X_FOR"] = int(os.getenv("PROXY_FIX_X_FOR", "0"))
+
+    # =====================================================
+    # DATABASE CONFIGURATION
+    # CURRENT:
+    # SQLite Local Database
+    #
+    # FUTURE:
+    # Neon PostgreSQL
+    #
+    # Only .env changes needed later
+    # =====================================================
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
+        "DATABASE_URL",
+        "sqlite:///site.db"
+    )
+
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # =====================================================
+    # READ REPLICA (optional)
+    # DATABASE_READ_URL: replica for read-only views
+    # DB_READ_STICKY_SECONDS: after a write, that visitor
+    #   reads from the primary for this long
+    # =====================================================
+
+    app.config["DATABASE_READ_URL"] = os.getenv("DATABASE_READ_URL")
+
+    app.config["DB_READ_STICKY_SECONDS"] = int(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+
+    # =====================================================
+    # PAGINATION CONFIGURATION
+    # "offset" -> classic numbered pages (COUNT + OFFSET)
+    # "keyset" -> older/newer cursors on (date_posted, id)
+    #
+    # PAGINATION_COUNT_TTL caches the approximate total
+    # shown in keyset mode (seconds, 0 = no total)
+    # =====================================================
+
+    app.config["PAGINATION_MODE"] = os.getenv("PAGINATION_MODE", "offset")
+
+    app.config["PAGINATION_COUNT_TTL"] = int(
+        os.getenv("PAGINATION_COUNT_TTL", "60")
+    )
+
+    app.config["POSTS_PER_PAGE"] = int(os.getenv("POSTS_PER_PAGE", "5"))
+
+    # =====================================================
+    # COMMENT THREADS
+    # Top-level threads per page, how deep replies are
+    # expanded inline and the max comments per render
+    # =====================================================
+
+    app.config["COMMENT_THREADS_PER_PAGE"] = int(
+        os.getenv("COMMENT_THREADS_PER_PAGE", "20")
+    )
+
+    app.config["COMMENT_MAX_DEPTH"] = int(os.getenv("COMMENT_MAX_DEPTH", "4"))
+
+    app.config["COMMENT_MAX_NODES"] = int(os.getenv("COMMENT_MAX_NODES", "300"))
+
+    # =====================================================
+    # FRAGMENT CACHE
+    # Rendered post cards and anonymous feed pages
+    # FRAGMENT_PAGE_TTL: seconds (0 disables page caching)
+    # =====================================================
+
+    app.config["FRAGMENT_CACHE_MAX_ENTRIES"] = int(
+        os.getenv("FRAGMENT_CACHE_MAX_ENTRIES", "5000")
+    )
+
+    app.config["FRAGMENT_CACHE_MAX_BYTES"] = int(
+        os.getenv("FRAGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+    )
+
+    app.config["FRAGMENT_PAGE_TTL"] = int(os.getenv("FRAGMENT_PAGE_TTL", "30"))
+
+    # =====================================================
+    # QUERY BUDGETS
+    # Routes declare a max SQL statement count. Exceeding
+    # it logs a warning, or raises when enforcement is on
+    # (tests / CI).
+    # =====================================================
+
+    app.config["QUERY_BUDGET_ENFORCE"] = os.getenv("QUERY_BUDGET_ENFORCE") == "1"
+
+    # =====================================================
+    # REQUEST METRICS
+    # METRICS_ENABLED: per-request timings at /metrics
+    # SLOW_QUERY_MS: log statements slower than this
+    #   (0 = off)
+    # SLOW_QUERY_LOG_PARAMS=1 logs their parameter values,
+    #   secrets included; local debugging only
+    # METRICS_TOKEN: bearer token required by /metrics and
+    #   /metrics/cache
+    # =====================================================
+
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") == "1"
+
+    app.config["SLOW_QUERY_MS"] = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+    app.config["SLOW_QUERY_LOG_PARAMS"] = os.getenv("SLOW_QUERY_LOG_PARAMS") == "1"
+
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN")
+
+    # =====================================================
+    # REQUEST PROFILER (see profiler.py)
+    # PROFILE_DIR: where profiles are written (unset = off)
+    # PROFILE_MODE: cprofile | sample
+    # PROFILE_SAMPLE_MS: sampling interval
+    # PROFILE_TOKEN_MAX_AGE: token lifetime in seconds
+    # =====================================================
+
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR")
+
+    app.config["PROFILE_MODE"] = os.getenv("PROFILE_MODE", "cprofile")
+
+    app.config["PROFILE_SAMPLE_MS"] = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+
+    app.config["PROFILE_TOKEN_MAX_AGE"] = int(os.getenv("PROFILE_TOKEN_MAX_AGE", "3600"))
+
+    # =====================================================
+    # LIKE WRITE-BEHIND BUFFER
+    # LIKE_WRITE_BEHIND=1 batches like toggles in memory
+    # and flushes them every LIKE_FLUSH_SECONDS, or early
+    # once LIKE_BUFFER_MAX (user, post) pairs are pending
+    # =====================================================
+
+    app.config["LIKE_WRITE_BEHIND"] = os.getenv("LIKE_WRITE_BEHIND") == "1"
+
+    app.config["LIKE_FLUSH_SECONDS"] = float(os.getenv("LIKE_FLUSH_SECONDS", "0.5"))
+
+    app.config["LIKE_BUFFER_MAX"] = int(os.getenv("LIKE_BUFFER_MAX", "1000"))
+
+    # =====================================================
+    # MAIL CONFIGURATION
+    # =====================================================
+
+    app.config["MAIL_SERVER"] = os.getenv("MAIL_SERVER", "smtp.gmail.com")
+
+    app.config["MAIL_PORT"] = int(os.getenv("MAIL_PORT", "587"))
+
+    app.config["MAIL_USE_TLS"] = os.getenv("MAIL_USE_TLS", "1") == "1"
+
+    app.config["MAIL_USE_SSL"] = False
+
+    app.config["MAIL_USERNAME"] = os.getenv("MAIL_USERNAME")
+
+    app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
+
+    app.config["MAIL_DEFAULT_SENDER"] = os.getenv(
+        "MAIL_USERNAME"
+    )
+
+    # =====================================================
+    # MAIL QUEUE CONFIGURATION
+    # MAIL_QUEUE_BACKEND: memory | outbox | sync
+    # =====================================================
+
+    app.config["MAIL_QUEUE_BACKEND"] = os.getenv("MAIL_QUEUE_BACKEND", "memory")
+
+    app.config["MAIL_QUEUE_WORKERS"] = int(os.getenv("MAIL_QUEUE_WORKERS", "1"))
+
+    app.config["MAIL_QUEUE_BATCH_SIZE"] = int(os.getenv("MAIL_QUEUE_BATCH_SIZE", "20"))
+
+    app.config["MAIL_QUEUE_POLL_SECONDS"] = float(os.getenv("MAIL_QUEUE_POLL_SECONDS", "2"))
+
+    app.config["MAIL_QUEUE_DRAIN_SECONDS"] = float(os.getenv("MAIL_QUEUE_DRAIN_SECONDS", "10"))
+
+    app.config["MAIL_MAX_RETRIES"] = int(os.getenv("MAIL_MAX_RETRIES", "5"))
+
+    app.config["MAIL_RETRY_BACKOFF"] = float(os.getenv("MAIL_RETRY_BACKOFF", "2"))
+
+    app.config["MAIL_OUTBOX_LEASE_SECONDS"] = int(os.getenv("MAIL_OUTBOX_LEASE_SECONDS", "300"))
+
+    # =====================================================
+    # PROFILE PICTURES
+    # IMAGE_WORKERS: background threads resizing uploads
+    # IMAGE_UPLOAD_TMP: where uploads are spooled (None =
+    # system temp dir)
+    # =====================================================
+
+    app.config["IMAGE_WORKERS"] = int(os.getenv("IMAGE_WORKERS", "2"))
+
+    app.config["IMAGE_UPLOAD_TMP"] = os.getenv("IMAGE_UPLOAD_TMP")
+
+    # =====================================================
+    # PASSWORD HASHING
+    # BCRYPT_LOG_ROUNDS: bcrypt work factor. Existing hashes
+    # are upgraded transparently at the next login.
+    # PASSWORD_HASH_WORKERS: threads for parallel checks
+    # PASSWORD_HISTORY_SIZE: recent passwords a user may not
+    # reuse; older history rows are deleted
+    # =====================================================
+
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+
+    app.config["PASSWORD_HASH_WORKERS"] = int(
+        os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1)))
+    )
+
+    app.config["PASSWORD_HISTORY_SIZE"] = int(os.getenv("PASSWORD_HISTORY_SIZE", "5"))
+
+    # =====================================================
+    # SESSION USER CACHE
+    # USER_CACHE_BACKEND: local | shared | none
+    # USER_CACHE_URL: redis URL for the shared backend
+    # (without one an in-memory stand-in is used)
+    # "local" is per process: with several gunicorn workers
+    # use "shared" + USER_CACHE_URL, or other workers show
+    # renamed/deleted users for up to USER_CACHE_TTL
+    # =====================================================
+
+    app.config["USER_CACHE_BACKEND"] = os.getenv("USER_CACHE_BACKEND", "local")
+
+    app.config["USER_CACHE_URL"] = os.getenv("USER_CACHE_URL")
+
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", "60"))
+
+    app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+    # =====================================================
+    # RATE LIMITING
+    # RATELIMIT_BACKEND: memory | shared | none
+    # RATELIMIT_URL: redis URL for the shared backend
+    # (without one an in-memory stand-in is used)
+    # RATELIMIT_STRATEGY: token_bucket | sliding_window
+    # RATELIMIT_<VIEW>: "count/period" per client, e.g.
+    # "10/minute"; empty turns that limit off
+    # =====================================================
+
+    app.config["RATELIMIT_BACKEND"] = os.getenv("RATELIMIT_BACKEND", "memory")
+
+    app.config["RATELIMIT_URL"] = os.getenv("RATELIMIT_URL")
+
+    app.config["RATELIMIT_STRATEGY"] = os.getenv("RATELIMIT_STRATEGY", "token_bucket")
+
+    app.config["RATELIMIT_MAX_KEYS"] = int(os.getenv("RATELIMIT_MAX_KEYS", "100000"))
+
+    # per client address
+    app.config["RATELIMIT_LOGIN"] = os.getenv("RATELIMIT_LOGIN", "10/minute")
+
+    app.config["RATELIMIT_REGISTER"] = os.getenv("RATELIMIT_REGISTER", "10/hour")
+
+    app.config["RATELIMIT_RESET_REQUEST"] = os.getenv("RATELIMIT_RESET_REQUEST", "5/hour")
+
+    # per logged-in user
+    app.config["RATELIMIT_LIKE"] = os.getenv("RATELIMIT_LIKE", "60/minute")
+
+    app.config["RATELIMIT_COMMENT"] = os.getenv("RATELIMIT_COMMENT", "10/minute")
+
+
+    # =====================================================
+    # OVERRIDES (create_app(config), tests, benchmarks)
+    # =====================================================
+
+    app.config.update(overrides or {})
+
+    # =====================================================
+    # ENGINE OPTIONS
+    # pool sizing / pre-ping / recycle for Postgres,
+    # WAL + busy_timeout for SQLite (see database.py)
+    # =====================================================
+
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    )
+
+    app.config.setdefault("SQLALCHEMY_BINDS", {})
+
+    if app.config["DATABASE_READ_URL"]:
+        app.config["SQLALCHEMY_BINDS"].setdefault("replica", {
+            "url": app.config["DATABASE_READ_URL"],
+            **engine_options(app.config["DATABASE_READ_URL"])
+        })
@@ -0,0 +1,77 @@
+from sqlalchemy import func, select, update
+
+from flaskblog import db
+from flaskblog.models import Post, PostLike, Comment
+
+# =====================================================
+# DENORMALIZED POST COUNTERS
+#
+# Post.like_count / Post.comment_count are adjusted with
+# a single relative UPDATE in the same transaction as
+# the PostLike / Comment write, so pages never need a
+# COUNT(*) and concurrent writers never lose updates.
+# =====================================================
+
+
+def _bump(column, post_id, delta):
+    result = db.session.execute(
+        update(Post)
+        .where(Post.id == post_id)
+        .values({column: column + delta})
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def bump_like_count(post_id, delta):
+    return _bump(Post.like_count, post_id, delta)
+
+
+def bump_comment_count(post_id, delta):
+    return _bump(Post.comment_count, post_id, delta)
+
+
+def toggle_like(user_id, post_id):
+    """Like or unlike a post. Returns True if the post is now liked.
+
+    The caller commits. Returns None when the post does not exist.
+    """
+    removed = (
+        PostLike.query
+        .filter_by(user_id=user_id, post_id=post_id)
+        .delete(synchronize_session=False)
+    )
+    if removed:
+        bump_like_count(post_id, -removed)
+        return False
+
+    if not bump_like_count(post_id, 1):
+        return None
+    db.session.add(PostLike(user_id=user_id, post_id=post_id))
+    return True
+
+
+def reconcile_counters():
+    """Recompute every post's counters from the source tables.
+
+    Returns the number of posts whose stored counters had drifted.
+    """
+    like_total = (
+        select(func.count(PostLike.id))
+        .where(PostLike.post_id == Post.id)
+        .scalar_subquery()
+    )
+    comment_total = (
+        select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id)
+        .scalar_subquery()
+    )
+
+    result = db.session.execute(
+        update(Post)
+        .where((Post.like_count != like_total) | (Post.comment_count != comment_total))
+        .values(like_count=like_total, comment_count=comment_total)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,140 @@
+from functools import wraps
+import os
+import time
+
+from flask import current_app, g, has_request_context, session as http_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# =====================================================
+# DATABASE ENGINE TUNING
+#
+# PostgreSQL / Neon:
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+#   DB_POOL_RECYCLE (Neon drops idle connections, so
+#   recycle below its idle timeout), DB_POOL_PRE_PING,
+#   DB_DISABLE_PREPARED=1 when going through the Neon
+#   pooler (PgBouncer transaction mode).
+#
+# SQLite:
+#   WAL journal so readers never block the writer,
+#   busy_timeout so writers wait for the lock instead of
+#   failing with "database is locked", synchronous=NORMAL
+#   (safe with WAL, far fewer fsyncs).
+#   DB_SQLITE_PRAGMAS=0 turns all of this off.
+# =====================================================
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def _env_flag(name, default):
+    return os.getenv(name, "1" if default else "0") == "1"
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database."""
+    if database_uri.startswith("sqlite"):
+        return {
+            "connect_args": {
+                "timeout": _env_int("DB_SQLITE_BUSY_TIMEOUT", 5000) / 1000,
+            },
+        }
+
+    options = {
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 280),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+    if _env_flag("DB_DISABLE_PREPARED", False) and "+psycopg" in database_uri:
+        options["connect_args"] = {"prepare_threshold": None}
+    return options
+
+
+@event.listens_for(Engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    if not _env_flag("DB_SQLITE_PRAGMAS", True):
+        return
+    if type(dbapi_connection).__module__.split(".")[0] != "sqlite3":
+        return
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={_env_int('DB_SQLITE_BUSY_TIMEOUT', 5000)}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+# =====================================================
+# READ REPLICA ROUTING
+#
+# With DATABASE_READ_URL set, views marked @read_replica
+# send their SELECTs to the "replica" bind. Everything
+# else goes to the primary:
+#   - any INSERT/UPDATE/DELETE or ORM flush
+#   - every read after a write in the same request
+#   - every read for DB_READ_STICKY_SECONDS after the
+#     visitor wrote something (read-your-own-writes,
+#     tracked in the session cookie)
+# Requests outside a view (CLI, background workers)
+# always use the primary.
+# =====================================================
+
+REPLICA_BIND = "replica"
+STICKY_KEY = "_db_primary_until"
+
+
+def read_replica(view):
+    """Let this view's reads go to the replica."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.db_read_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def _is_read(clause):
+    if clause is None:
+        return False
+    if getattr(clause, "is_select", False):
+        return True
+    if getattr(clause, "is_text", False):
+        return clause.text.lstrip()[:6].upper() in ("SELECT", "WITH")
+    return False
+
+
+def _mark_written():
+    if not has_request_context():
+        return
+    g.db_wrote = True
+    ttl = current_app.config["DB_READ_STICKY_SECONDS"]
+    if ttl > 0:
+        http_session[STICKY_KEY] = time.time() + ttl
+
+
+def _replica_allowed():
+    if not has_request_context() or not g.get("db_read_replica") or g.get("db_wrote"):
+        return False
+    return http_session.get(STICKY_KEY, 0) < time.time()
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that can serve reads from the replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines:
+            if getattr(clause, "is_dml", False):
+                _mark_written()
+            elif _is_read(clause) and _replica_allowed():
+                return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _flushed(session, flush_context):
+    if REPLICA_BIND in session._db.engines:
+        _mark_written()
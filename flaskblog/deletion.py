@@ -0,0 +1,99 @@
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.orm import aliased
+
+from flaskblog import db
+from flaskblog.models import User, Post, PostLike, Comment, PasswordHistory
+from flaskblog.search import unindex_posts
+
+# =====================================================
+# SET-BASED DELETION
+#
+# Posts and accounts are removed with one DELETE per
+# child table instead of session.delete(), which loads
+# every like and comment into memory first and, as the
+# foreign keys have no ON DELETE rule, fails on
+# PostgreSQL as soon as a child row exists. Explicit
+# statements also work on SQLite, which only enforces
+# foreign keys with a pragma.
+#
+# Counters of the posts that stay are adjusted and the
+# search index cleaned in the same transaction. The
+# caller commits, then drops cached cards with
+# invalidate_posts() for the ids returned.
+# =====================================================
+
+# ids per IN (...) list, keeps bind parameters under SQLite's limit
+CHUNK = 500
+
+
+def delete_posts(post_ids):
+    """Delete posts with all their likes and comments. Caller commits."""
+    post_ids = list(post_ids)
+    for i in range(0, len(post_ids), CHUNK):
+        chunk = post_ids[i:i + CHUNK]
+        unindex_posts(chunk)
+        # one parent/reply hierarchy never spans posts, so each post's
+        # comments go in a single statement
+        for statement in (
+            delete(PostLike).where(PostLike.post_id.in_(chunk)),
+            delete(Comment).where(Comment.post_id.in_(chunk)),
+            delete(Post).where(Post.id.in_(chunk)),
+        ):
+            db.session.execute(statement.execution_options(synchronize_session=False))
+    return post_ids
+
+
+def delete_user(user_id):
+    """Delete a user with their posts, comments, likes and password history.
+
+    Replies other people wrote under the user's comments go too, the
+    thread they belonged to no longer exists. Returns the ids of every
+    post deleted or whose counters changed. Caller commits.
+    """
+    touched = set(delete_posts(
+        db.session.scalars(select(Post.id).where(Post.user_id == user_id)).all()
+    ))
+
+    # the user's comments on other posts plus everything under them
+    # (UNION: a reply by the user under their own comment counts once)
+    doomed = select(Comment.id).where(Comment.user_id == user_id).cte("doomed", recursive=True)
+    reply = aliased(Comment)
+    doomed = doomed.union(select(reply.id).where(reply.parent_id == doomed.c.id))
+    doomed_ids = select(doomed.c.id)
+    removed = db.session.execute(
+        select(Comment.post_id, func.count())
+        .where(Comment.id.in_(doomed_ids))
+        .group_by(Comment.post_id)
+    ).all()
+    _bump(Post.comment_count, removed)
+    db.session.execute(
+        delete(Comment).where(Comment.id.in_(doomed_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+    liked = db.session.scalars(select(PostLike.post_id).where(PostLike.user_id == user_id)).all()
+    _bump(Post.like_count, [(post_id, 1) for post_id in liked])
+
+    for statement in (
+        delete(PostLike).where(PostLike.user_id == user_id),
+        delete(PasswordHistory).where(PasswordHistory.user_id == user_id),
+        delete(User).where(User.id == user_id),
+    ):
+        db.session.execute(statement.execution_options(synchronize_session=False))
+
+    touched.update(post_id for post_id, _ in removed)
+    touched.update(liked)
+    return touched
+
+
+def _bump(column, decrements):
+    """Lower ``column`` by n for each (post_id, n), one executemany."""
+    if not decrements:
+        return
+    posts = Post.__table__
+    db.session.execute(
+        posts.update()
+        .where(posts.c.id == bindparam("b_id"))
+        .values({column.key: posts.c[column.key] - bindparam("b_n")}),
+        [{"b_id": post_id, "b_n": n} for post_id, n in decrements]
+    )
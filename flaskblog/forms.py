@@ -7,6 +7,33 @@ from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationE
 from flask_login import current_user
 from flaskblog.models import User
 
+TAKEN = {
+    'username': 'That username is taken. Please choose a different one.',
+    'email': 'That email is taken. Please choose a different one.',
+}
+
+
+def check_available(form, user=None):
+    """Check the form's username and email with one query (User.taken).
+
+    Fields that already failed validation, or that ``user`` (the account
+    being edited) keeps unchanged, are skipped. Returns False and adds
+    field errors if either is taken.
+    """
+    values = {}
+    for name in TAKEN:
+        field = form[name]
+        if field.errors or (user is not None and field.data == getattr(user, name)):
+            continue
+        values[name] = field.data
+    if not values:
+        return True
+    taken = User.taken(exclude_id=user.id if user is not None else None, **values)
+    for name in taken:
+        form[name].errors.append(TAKEN[name])
+    return not taken
+
+
 class RegistrationForm(FlaskForm):
     username = StringField('Username',
                            validators=[DataRequired(), Length(min=2, max=20)])
@@ -17,15 +44,9 @@ class RegistrationForm(FlaskForm):
                                      validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Sign Up')
 
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('That username is taken. Please choose a different one.')
-
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('That email is taken. Please choose a different one.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        return check_available(self) and valid
 
 class LoginForm(FlaskForm):
     email = StringField('Email',
@@ -42,17 +63,13 @@ class UpdateAccountForm(FlaskForm):
     picture = FileField('Update Profile Picture', validators=[FileAllowed(['jpg', 'png'])])
     submit = SubmitField('Update')
 
-    def validate_username(self, username):
-        if username.data != current_user.username:
-            user = User.query.filter_by(username=username.data).first()
-            if user:
-                raise ValidationError('That username is taken. Please choose a different one.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        return check_available(self, current_user) and valid
 
-    def validate_email(self, email):
-        if email.data != current_user.email:
-            user = User.query.filter_by(email=email.data).first()
-            if user:
-                raise ValidationError('That email is taken. Please choose a different one.')
+class DeleteAccountForm(FlaskForm):
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Delete Account')
 
 class PostForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired()])
@@ -74,7 +91,3 @@ class ResetPasswordForm(FlaskForm):
     confirm_password = PasswordField('Confirm Password',
                                      validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Reset Password')
-    
-    def validate_password(self, password):
-        if current_user.is_authenticated and current_user.check_password_history(password.data):
-            raise ValidationError('Cannot reuse an old password.')
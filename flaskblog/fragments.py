@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from functools import wraps
+import threading
+import time
+
+from flask import current_app, render_template, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+from werkzeug.wrappers import Response
+
+from flaskblog.conditional import respond
+
+# =====================================================
+# RENDERED FRAGMENT CACHE
+#
+# Post cards are cached per post and reused while the
+# post's updated_at (bumped by edits and by like/comment
+# counter updates) and its author's name/picture stay
+# the same. Whole feed pages are cached for anonymous
+# visitors for a short TTL and dropped as soon as a post
+# is created, edited or deleted.
+#
+# Bounded by entry count and total bytes, LRU eviction.
+# =====================================================
+
+
+class FragmentCache:
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, entry_version, expires, size = entry
+                if entry_version == version and (expires is None or expires > time.monotonic()):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def set(self, key, value, version=None, ttl=None, size=None):
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[3]
+            self._data[key] = (value, version, expires, size)
+            self.size += size
+            while len(self._data) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.size -= evicted[3]
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= old[3]
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k[0] == prefix]:
+                self.size -= self._data.pop(key)[3]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def init_app(app):
+    app.extensions["fragment_cache"] = FragmentCache(
+        app.config["FRAGMENT_CACHE_MAX_ENTRIES"],
+        app.config["FRAGMENT_CACHE_MAX_BYTES"]
+    )
+    app.jinja_env.globals["post_card"] = post_card
+
+
+# the current application's cache
+fragment_cache = LocalProxy(lambda: current_app.extensions["fragment_cache"])
+
+
+# ---------------- POST CARDS ----------------
+def post_card(post):
+    """Rendered _post_card.html for a post, from cache when still current."""
+    version = (post.updated_at, post.author.username, post.author.image_file)
+    key = ("card", post.id)
+    html = fragment_cache.get(key, version)
+    if html is None:
+        html = render_template("_post_card.html", post=post)
+        fragment_cache.set(key, html, version)
+    return Markup(html)
+
+
+# ---------------- ANONYMOUS FEED PAGES ----------------
+# the query arguments feed views read; anything else in the URL
+# (tracking parameters, cache busters) gets the same page
+PAGE_ARGS = ("page", "before", "after")
+
+
+def cache_anonymous_page(view):
+    """Serve the rendered page from cache for anonymous visitors.
+
+    The ETag is kept with the page so repeat visitors still get 304s
+    on a cache hit.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        ttl = current_app.config["FRAGMENT_PAGE_TTL"]
+        if ttl <= 0 or session.get("_flashes") or current_user.is_authenticated:
+            return view(*args, **kwargs)
+
+        key = ("page", request.path, tuple(request.args.get(name) for name in PAGE_ARGS))
+        cached = fragment_cache.get(key)
+        if cached is not None:
+            html, etag = cached
+            return respond(etag, None, lambda: html)
+
+        response = view(*args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            html = response.get_data(as_text=True)
+            fragment_cache.set(key, (html, response.get_etag()[0]), ttl=ttl, size=len(html))
+        return response
+    return wrapped
+
+
+def invalidate_post(post_id):
+    """Drop a post's card and every cached feed page."""
+    fragment_cache.delete(("card", post_id))
+    fragment_cache.delete_prefix("page")
+
+
+def invalidate_posts(post_ids):
+    """invalidate_post() for many posts, clearing the feed pages once."""
+    for post_id in post_ids:
+        fragment_cache.delete(("card", post_id))
+    fragment_cache.delete_prefix("page")
@@ -0,0 +1,251 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from flask import current_app, request
+
+from flaskblog import db
+from flaskblog.models import User
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# PROFILE PICTURE PIPELINE
+#
+# account() streams the upload to a temp file while
+# hashing it, then hands it to a worker thread which
+# renders every size in JPEG and WebP and only then
+# points user.image_file at the new picture.
+#
+# Names are derived from the content hash
+# (p_<hash>.jpg, p_<hash>_48.webp, ...), so identical
+# uploads are stored once and every file can be cached
+# forever by browsers and the CDN.
+#
+# A picture is only garbage collected once no user
+# points at it and it was not rendered or reused by a
+# duplicate upload within ORPHAN_GRACE_SECONDS: that
+# upload may not be committed yet. What this leaves
+# behind, flask gc-profile-pics removes later.
+# =====================================================
+
+SIZES = (48, 125, 256)
+FORMATS = ("jpg", "webp")
+CANONICAL_SIZE = 125
+DEFAULT_IMAGE = "default.jpg"
+CHUNK_SIZE = 64 * 1024
+
+# image_file is String(20): "p_" + 14 hex + ".jpg"
+HASH_LENGTH = 14
+HASHED_NAME = re.compile(r"^p_([0-9a-f]{%d})(?:_\d+\.\w+|\.jpg)$" % HASH_LENGTH)
+
+ORPHAN_GRACE_SECONDS = 300
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config["IMAGE_WORKERS"],
+                    thread_name_prefix="images"
+                )
+    return _executor
+
+
+def pictures_dir():
+    return os.path.join(current_app.root_path, "static", "profile_pics")
+
+
+def variant_name(digest, size=CANONICAL_SIZE, fmt="jpg"):
+    if size == CANONICAL_SIZE and fmt == "jpg":
+        return f"p_{digest}.jpg"
+    return f"p_{digest}_{size}.{fmt}"
+
+
+def image_digest(image_file):
+    match = HASHED_NAME.match(image_file or "")
+    return match.group(1) if match else None
+
+
+def avatar_url(image_file, size=CANONICAL_SIZE, fmt="jpg"):
+    """Static filename of the smallest variant at least ``size`` pixels."""
+    digest = image_digest(image_file)
+    if digest is None:
+        return "profile_pics/" + image_file
+    best = next((s for s in SIZES if s >= size), SIZES[-1])
+    return "profile_pics/" + variant_name(digest, best, fmt)
+
+
+def init_app(app):
+    app.jinja_env.globals["avatar_url"] = avatar_url
+    app.jinja_env.globals["image_digest"] = image_digest
+    app.after_request(cache_hashed_pictures)
+
+
+def cache_hashed_pictures(response):
+    # content-addressed names never change, let clients keep them
+    if request.endpoint == "static" and image_digest(os.path.basename(request.path)):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+# ---------------- UPLOAD ----------------
+def _stream_to_disk(file_storage):
+    sha = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", dir=current_app.config["IMAGE_UPLOAD_TMP"])
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = file_storage.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha.update(chunk)
+            out.write(chunk)
+    return tmp_path, sha.hexdigest()[:HASH_LENGTH]
+
+
+def save_profile_picture(file_storage, user_id):
+    """Accept an upload for ``user_id``.
+
+    Returns the new image_file name when the picture already exists
+    (duplicate upload), otherwise None: the picture is rendered in the
+    background and assigned to the user once ready.
+    """
+    tmp_path, digest = _stream_to_disk(file_storage)
+    name = variant_name(digest)
+
+    if _touch(name):
+        os.remove(tmp_path)
+        return name
+
+    _pool().submit(
+        _process_upload, current_app._get_current_object(), tmp_path, digest, user_id
+    )
+    return None
+
+
+# ---------------- PROCESSING ----------------
+def _render_variants(tmp_path, digest):
+    # Pillow is only needed here, keep it out of worker start-up
+    from PIL import Image, ImageOps
+
+    directory = pictures_dir()
+    with Image.open(tmp_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        # the canonical file is written last: once it exists, every
+        # variant does, which is what the duplicate check relies on
+        variants = sorted(
+            ((size, fmt) for size in SIZES for fmt in FORMATS),
+            key=lambda v: v == (CANONICAL_SIZE, "jpg")
+        )
+        for size, fmt in variants:
+            variant = img.copy()
+            variant.thumbnail((size, size))
+            final = os.path.join(directory, variant_name(digest, size, fmt))
+            # a name of its own, the same picture may be rendered twice at once
+            fd, partial = tempfile.mkstemp(prefix="render-", suffix=".part", dir=directory)
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    if fmt == "jpg":
+                        variant.save(out, "JPEG", quality=85, optimize=True, progressive=True)
+                    else:
+                        variant.save(out, "WEBP", quality=80, method=4)
+                os.replace(partial, final)
+            except BaseException:
+                os.remove(partial)
+                raise
+
+
+def _process_upload(app, tmp_path, digest, user_id):
+    with app.app_context():
+        try:
+            _render_variants(tmp_path, digest)
+        except Exception:
+            logger.exception("Could not process profile picture for user %s", user_id)
+            return
+        finally:
+            os.remove(tmp_path)
+
+        try:
+            assign_picture(user_id, variant_name(digest))
+        except Exception:
+            db.session.rollback()
+            logger.exception("Could not assign profile picture for user %s", user_id)
+
+
+def assign_picture(user_id, name):
+    """Point the user at ``name`` and clean up the picture it replaces."""
+    user = db.session.get(User, user_id)
+    if user is None:
+        return
+    previous = user.image_file
+    user.image_file = name
+    db.session.commit()
+    if previous != name:
+        collect_orphans([previous])
+
+
+# ---------------- GARBAGE COLLECTION ----------------
+def _touch(name):
+    """Mark a stored picture as just used. False when it does not exist."""
+    try:
+        os.utime(os.path.join(pictures_dir(), name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _recently_used(name):
+    try:
+        modified = os.path.getmtime(os.path.join(pictures_dir(), name))
+    except FileNotFoundError:
+        return False
+    return time.time() - modified < ORPHAN_GRACE_SECONDS
+
+
+def _files_for(image_file):
+    """Every file of a picture, the canonical one (the duplicate check's) first."""
+    digest = image_digest(image_file)
+    if digest is None:
+        return [image_file]
+    variants = [variant_name(digest, size, fmt) for size in SIZES for fmt in FORMATS]
+    return sorted(variants, key=lambda name: name != variant_name(digest))
+
+
+def collect_orphans(image_files):
+    """Delete pictures no user references any more. Returns files removed."""
+    removed = []
+    for image_file in image_files:
+        if not image_file or image_file == DEFAULT_IMAGE:
+            continue
+        if User.query.filter_by(image_file=image_file).first():
+            continue
+        if _recently_used(image_file):
+            continue
+        for filename in _files_for(image_file):
+            path = os.path.join(pictures_dir(), filename)
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(filename)
+    return removed
+
+
+def unreferenced_pictures():
+    """Canonical names of files in profile_pics that no user points at."""
+    referenced = {name for (name,) in db.session.query(User.image_file).distinct()}
+    candidates = set()
+    for filename in os.listdir(pictures_dir()):
+        if filename == DEFAULT_IMAGE or filename.endswith(".part"):
+            continue
+        digest = image_digest(filename)
+        candidates.add(variant_name(digest) if digest else filename)
+    return sorted(candidates - referenced)
@@ -0,0 +1,198 @@
+import atexit
+from datetime import datetime
+from importlib import import_module
+import logging
+import threading
+
+from flask import current_app
+from sqlalchemy import bindparam, select, tuple_
+from werkzeug.local import LocalProxy
+
+from flaskblog import db
+from flaskblog.models import User, Post, PostLike
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# WRITE-BEHIND LIKE BUFFER (LIKE_WRITE_BEHIND=1)
+#
+# like_post() records the wanted state of each
+# (user_id, post_id) in memory instead of writing it.
+# Repeated toggles inside the window just flip that
+# state. A background thread flushes every
+# LIKE_FLUSH_SECONDS (or once LIKE_BUFFER_MAX pairs are
+# pending) with one INSERT ... ON CONFLICT DO NOTHING,
+# one DELETE and one counter UPDATE per touched post,
+# all in a single commit.
+#
+# Counters move by the rows actually inserted/deleted,
+# so they stay exact even when several workers buffer
+# the same pair. Pending likes are flushed at interpreter
+# exit; a hard crash loses at most one window.
+# =====================================================
+
+# pairs per statement, keeps bind parameters under SQLite's limit
+CHUNK = 500
+
+
+class LikeBuffer:
+
+    def __init__(self, app):
+        # the flusher outlives the request that started it
+        self.app = app
+        self._pending = {}
+        self._flushing = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.flushes = 0
+
+    # ---------------- PRODUCER ----------------
+    def toggle(self, user_id, post_id):
+        """Buffer a like toggle. Returns the new state, None if no such post."""
+        key = (user_id, post_id)
+        with self._cond:
+            liked = self._pending.get(key, self._flushing.get(key))
+        if liked is None:
+            row = db.session.execute(
+                select(Post.id, PostLike.id)
+                .outerjoin(PostLike, (PostLike.post_id == Post.id) & (PostLike.user_id == user_id))
+                .where(Post.id == post_id)
+            ).first()
+            if row is None:
+                return None
+            liked = row[1] is not None
+
+        self.start()
+        with self._cond:
+            # another request from the same user may have flipped it meanwhile
+            liked = not self._pending.get(key, liked)
+            self._pending[key] = liked
+            if len(self._pending) >= self.app.config["LIKE_BUFFER_MAX"]:
+                self._cond.notify()
+        return liked
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def start(self):
+        """Start the flusher thread (idempotent, once per application)."""
+        if self._thread is not None:
+            return
+        with self._flush_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="like-buffer", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    # ---------------- FLUSHER ----------------
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                with self._cond:
+                    if not self._stopping and len(self._pending) < current_app.config["LIKE_BUFFER_MAX"]:
+                        self._cond.wait(current_app.config["LIKE_FLUSH_SECONDS"])
+                    if self._stopping:
+                        return
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Could not flush buffered likes")
+
+    def flush(self):
+        """Write every pending toggle in one transaction. Returns pairs written."""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+            if not batch:
+                return 0
+            try:
+                _write(batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._cond:
+                    # keep anything toggled again since, retry the rest
+                    for key, liked in batch.items():
+                        self._pending.setdefault(key, liked)
+                raise
+            finally:
+                with self._cond:
+                    self._flushing = {}
+            self.flushes += 1
+            return len(batch)
+
+    def shutdown(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(self.app.config["LIKE_FLUSH_SECONDS"] + 5)
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Lost buffered likes at shutdown")
+
+
+def _write(batch):
+    likes = [key for key, liked in batch.items() if liked]
+    unlikes = [key for key, liked in batch.items() if not liked]
+    table = PostLike.__table__
+    deltas = {}
+
+    if likes:
+        # posts and accounts may have been deleted since the toggle
+        existing = set(db.session.scalars(
+            select(Post.id).where(Post.id.in_({post_id for _, post_id in likes}))
+        ))
+        users = set(db.session.scalars(
+            select(User.id).where(User.id.in_({user_id for user_id, _ in likes}))
+        ))
+        now = datetime.utcnow()
+        rows = [
+            {"user_id": user_id, "post_id": post_id, "timestamp": now}
+            for user_id, post_id in likes if post_id in existing and user_id in users
+        ]
+        # ON CONFLICT lives in the dialect packages (postgresql, sqlite);
+        # load only the one in use, the Postgres one is slow to import
+        insert = import_module(f"sqlalchemy.dialects.{db.engine.dialect.name}").insert
+        for i in range(0, len(rows), CHUNK):
+            inserted = db.session.execute(
+                insert(table).values(rows[i:i + CHUNK])
+                .on_conflict_do_nothing(index_elements=["user_id", "post_id"])
+                .returning(table.c.post_id)
+            ).scalars()
+            for post_id in inserted:
+                deltas[post_id] = deltas.get(post_id, 0) + 1
+
+    for i in range(0, len(unlikes), CHUNK):
+        deleted = db.session.execute(
+            table.delete()
+            .where(tuple_(table.c.user_id, table.c.post_id).in_(unlikes[i:i + CHUNK]))
+            .returning(table.c.post_id)
+        ).scalars()
+        for post_id in deleted:
+            deltas[post_id] = deltas.get(post_id, 0) - 1
+
+    changed = [{"b_id": post_id, "b_delta": delta} for post_id, delta in deltas.items() if delta]
+    if changed:
+        posts = Post.__table__
+        db.session.execute(
+            posts.update()
+            .where(posts.c.id == bindparam("b_id"))
+            .values(like_count=posts.c.like_count + bindparam("b_delta")),
+            changed
+        )
+
+
+def init_app(app):
+    app.extensions["like_buffer"] = LikeBuffer(app)
+
+
+# the current application's buffer
+like_buffer = LocalProxy(lambda: current_app.extensions["like_buffer"])
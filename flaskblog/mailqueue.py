@@ -0,0 +1,354 @@
+import atexit
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import event, select, update
+from werkzeug.local import LocalProxy
+
+from flaskblog import db, mail
+from flaskblog.database import RoutingSession
+from flaskblog.models import MailOutbox
+
+logger = logging.getLogger(__name__)
+
+# session.info key: messages waiting for the transaction to commit
+PENDING_MAIL = "mailqueue_pending"
+
+# =====================================================
+# OUTBOUND MAIL QUEUE
+#
+# Request handlers call enqueue_mail() and return
+# immediately; worker threads deliver the messages in
+# batches over one persistent SMTP connection, retrying
+# failures with exponential backoff.
+#
+# A message belongs to the caller's transaction: it is
+# handed over when the session commits and dropped on
+# rollback, so mail only goes out for changes that were
+# actually saved. The caller commits.
+#
+# MAIL_QUEUE_BACKEND:
+#   "memory" -> in-process queue (default, lost on crash)
+#   "outbox" -> durable mail_outbox table, survives
+#               restarts, shared by all workers
+#   "sync"   -> send inline (debugging)
+# =====================================================
+
+
+class MemoryBackend:
+    """In-process queue ordered by the time each job may next be tried."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+
+    def put(self, payload):
+        self._push({"payload": payload, "attempts": 0}, time.time())
+
+    def _push(self, job, not_before):
+        with self._cond:
+            heapq.heappush(self._heap, (not_before, next(self._counter), job))
+            self._cond.notify()
+
+    def take(self, limit, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    batch = []
+                    while self._heap and self._heap[0][0] <= now and len(batch) < limit:
+                        batch.append(heapq.heappop(self._heap)[2])
+                    self._in_flight += len(batch)
+                    return batch
+                if now >= deadline:
+                    return []
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._cond.wait(wait)
+
+    def done(self, job):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def retry(self, job, delay):
+        job["attempts"] += 1
+        with self._cond:
+            self._in_flight -= 1
+        self._push(job, time.time() + delay)
+
+    def fail(self, job):
+        self.done(job)
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap) + self._in_flight
+
+
+class OutboxBackend:
+    """Durable queue stored in the mail_outbox table."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+
+    def put(self, payload):
+        # saved by the caller's commit, together with what caused it
+        db.session.add(MailOutbox(payload=json.dumps(payload)))
+
+    def wake(self):
+        self._wakeup.set()
+
+    def take(self, limit, timeout):
+        # "sending" rows are leased until not_before; a worker that died
+        # mid-send lets the lease expire and another worker picks it up
+        now = datetime.utcnow()
+        claimable = (
+            MailOutbox.status.in_(("pending", "sending")),
+            MailOutbox.not_before <= now,
+        )
+        # SKIP LOCKED keeps PostgreSQL workers off each other's rows; SQLite
+        # ignores it, the conditional UPDATE below is what decides
+        ids = db.session.scalars(
+            select(MailOutbox.id).where(*claimable)
+            .order_by(MailOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not ids:
+            db.session.rollback()
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            return []
+
+        lease = now + timedelta(seconds=current_app.config["MAIL_OUTBOX_LEASE_SECONDS"])
+        claimed = [
+            row_id for row_id in ids
+            if db.session.execute(
+                update(MailOutbox)
+                .where(MailOutbox.id == row_id, *claimable)
+                .values(status="sending", not_before=lease)
+                .execution_options(synchronize_session=False)
+            ).rowcount == 1
+        ]
+        rows = db.session.execute(
+            select(MailOutbox.id, MailOutbox.payload, MailOutbox.attempts)
+            .where(MailOutbox.id.in_(claimed))
+            .order_by(MailOutbox.id)
+        ).all() if claimed else []
+        db.session.commit()
+        return [
+            {"id": row.id, "payload": json.loads(row.payload), "attempts": row.attempts}
+            for row in rows
+        ]
+
+    def done(self, job):
+        MailOutbox.query.filter_by(id=job["id"]).delete()
+        db.session.commit()
+
+    def retry(self, job, delay):
+        MailOutbox.query.filter_by(id=job["id"]).update({
+            "status": "pending",
+            "attempts": job["attempts"] + 1,
+            "not_before": datetime.utcnow() + timedelta(seconds=delay),
+        })
+        db.session.commit()
+
+    def fail(self, job):
+        MailOutbox.query.filter_by(id=job["id"]).update({
+            "status": "failed",
+            "attempts": job["attempts"] + 1,
+        })
+        db.session.commit()
+
+    def pending(self):
+        return MailOutbox.query.filter(MailOutbox.status != "failed").count()
+
+
+class MailQueue:
+
+    def __init__(self, app):
+        # workers outlive the request that started them
+        self.app = app
+        if app.config["MAIL_QUEUE_BACKEND"] == "outbox":
+            self.backend = OutboxBackend()
+        else:
+            self.backend = MemoryBackend()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    # ---------------- PRODUCER ----------------
+    def enqueue(self, payload):
+        """Queue ``payload`` with the current transaction (see _release)."""
+        session = db.session()
+        if not session.in_transaction():
+            # begin now (no connection yet), or a rollback would be a
+            # no-op that never reaches _drop_mail
+            session.begin()
+        pending = session.info.setdefault(PENDING_MAIL, [])
+        if self.app.config["MAIL_QUEUE_BACKEND"] == "outbox":
+            self.start()
+            self.backend.put(payload)
+        pending.append(payload)
+
+    def _release(self, payloads):
+        """After the commit: deliver or queue, or wake the outbox workers."""
+        mode = self.app.config["MAIL_QUEUE_BACKEND"]
+        try:
+            if mode == "sync":
+                with mail.connect() as conn:
+                    for payload in payloads:
+                        conn.send(build_message(payload))
+            elif mode == "outbox":
+                self.backend.wake()
+            else:
+                self.start()
+                for payload in payloads:
+                    self.backend.put(payload)
+        except Exception:
+            # the change is committed already, don't fail the caller
+            logger.exception("Could not hand over %d mail(s)", len(payloads))
+
+    def start(self):
+        """Start the worker threads (idempotent, once per application)."""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.app.config["MAIL_QUEUE_WORKERS"]):
+                thread = threading.Thread(
+                    target=self._run, name=f"mail-queue-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.shutdown)
+
+    # ---------------- WORKER ----------------
+    def _run(self):
+        with self.app.app_context():
+            conn = None
+            while not self._stopping.is_set():
+                try:
+                    batch = self.backend.take(
+                        current_app.config["MAIL_QUEUE_BATCH_SIZE"],
+                        current_app.config["MAIL_QUEUE_POLL_SECONDS"]
+                    )
+                except Exception:
+                    logger.exception("Mail queue backend error")
+                    db.session.rollback()
+                    time.sleep(current_app.config["MAIL_QUEUE_POLL_SECONDS"])
+                    continue
+
+                if not batch:
+                    conn = _close(conn)
+                    continue
+
+                for job in batch:
+                    try:
+                        if conn is None:
+                            conn = mail.connect()
+                            conn.__enter__()
+                        conn.send(build_message(job["payload"]))
+                    except Exception as e:
+                        conn = _close(conn)
+                        self._handle_failure(job, e)
+                    else:
+                        self.backend.done(job)
+
+            _close(conn)
+
+    def _handle_failure(self, job, error):
+        attempts = job["attempts"] + 1
+        recipients = job["payload"]["recipients"]
+        if attempts > current_app.config["MAIL_MAX_RETRIES"]:
+            logger.error("Giving up on mail to %s after %d attempts: %s",
+                         recipients, attempts, error)
+            self.backend.fail(job)
+            return
+
+        delay = current_app.config["MAIL_RETRY_BACKOFF"] * (2 ** job["attempts"])
+        logger.warning("Mail to %s failed (attempt %d), retrying in %.1fs: %s",
+                       recipients, attempts, delay, error)
+        self.backend.retry(job, delay)
+
+    # ---------------- SHUTDOWN ----------------
+    def drain(self, timeout=None):
+        """Block until the queue is empty or ``timeout`` seconds pass."""
+        deadline = time.time() + (timeout if timeout is not None else 1e9)
+        while time.time() < deadline:
+            with self.app.app_context():
+                if not self.backend.pending():
+                    return True
+            time.sleep(0.05)
+        return False
+
+    def shutdown(self):
+        # the outbox is durable, only the in-memory queue needs flushing
+        if isinstance(self.backend, MemoryBackend):
+            self.drain(self.app.config["MAIL_QUEUE_DRAIN_SECONDS"])
+        self._stopping.set()
+
+
+def _close(conn):
+    if conn is not None:
+        try:
+            conn.__exit__(None, None, None)
+        except Exception:
+            pass
+    return None
+
+
+def build_message(payload):
+    return Message(
+        payload["subject"],
+        sender=payload.get("sender") or current_app.config.get("MAIL_DEFAULT_SENDER"),
+        recipients=payload["recipients"],
+        body=payload.get("body"),
+        html=payload.get("html")
+    )
+
+
+def init_app(app):
+    app.extensions["mail_queue"] = MailQueue(app)
+
+
+# the current application's queue
+mail_queue = LocalProxy(lambda: current_app.extensions["mail_queue"])
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _release_mail(session):
+    payloads = session.info.pop(PENDING_MAIL, None)
+    if payloads:
+        # commits happen inside the app context that queued the mail
+        mail_queue._release(payloads)
+
+
+@event.listens_for(RoutingSession, "after_soft_rollback")
+def _drop_mail(session, previous_transaction):
+    # outbox rows went with the rollback, queued payloads go too
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_MAIL, None)
+
+
+def enqueue_mail(subject, recipients, body=None, html=None, sender=None):
+    """Queue a message for background delivery once the caller commits."""
+    mail_queue.enqueue({
+        "subject": subject,
+        "recipients": list(recipients),
+        "body": body,
+        "html": html,
+        "sender": sender,
+    })
@@ -0,0 +1,107 @@
+from email import message_from_bytes
+import socketserver
+import threading
+
+# =====================================================
+# LOCAL FAKE SMTP SINK
+#
+# A tiny SMTP server that accepts everything and keeps
+# the messages in memory. Point MAIL_SERVER/MAIL_PORT at
+# it (MAIL_USE_TLS=False) in tests or local development:
+#
+#   sink = MailSink(port=1025).start()
+#   ...
+#   sink.messages  -> list of email.message.Message
+#   sink.stop()
+#
+# or run it standalone with `flask mail-sink`.
+# =====================================================
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connected()
+        envelope = {"from": None, "to": []}
+        self._reply("220 flaskblog mail sink ready")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("utf-8", "replace").strip()
+            verb = command[:4].upper()
+
+            if verb in ("HELO", "EHLO"):
+                self._reply("250 flaskblog")
+            elif verb == "MAIL":
+                envelope = {"from": command[10:].strip(), "to": []}
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                envelope["to"].append(command[8:].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    if chunk.startswith(b".."):
+                        chunk = chunk[1:]
+                    data.append(chunk)
+                sink.record(envelope, b"".join(data))
+                self._reply("250 OK: queued")
+            elif verb == "RSET":
+                envelope = {"from": None, "to": []}
+                self._reply("250 OK")
+            elif verb == "NOOP":
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SMTPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class MailSink:
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = []
+        self.envelopes = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def connected(self):
+        with self._lock:
+            self.connections += 1
+
+    def record(self, envelope, raw):
+        with self._lock:
+            self.envelopes.append(envelope)
+            self.messages.append(message_from_bytes(raw))
+
+    def start(self):
+        self._server = _SMTPServer((self.host, self.port), _SMTPHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
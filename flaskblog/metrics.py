@@ -0,0 +1,267 @@
+from bisect import bisect_left
+import hmac
+import logging
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, g, has_app_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# REQUEST INSTRUMENTATION
+#
+# For every request: wall time, number of SQL statements,
+# time spent in SQL and time spent rendering templates,
+# aggregated per endpoint into histograms and served at
+# /metrics in Prometheus text format. Statements slower
+# than SLOW_QUERY_MS are logged with their parameters.
+#
+# Numbers are per process; with several workers, scrape
+# each one (or sum them in Prometheus).
+# METRICS_TOKEN, when set, is required as a bearer token.
+# =====================================================
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [
+                (label_values, list(buckets), count, total)
+                for label_values, (buckets, count, total) in sorted(self._series.items())
+            ]
+        for label_values, buckets, count, total in items:
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, hits in zip(self.buckets, buckets):
+                cumulative += hits
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels.rstrip(',')}}} {total}")
+            lines.append(f"{self.name}_count{{{labels.rstrip(',')}}} {count}")
+        return lines
+
+
+class Counter:
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+
+def _labels(names, values):
+    return "".join(f'{name}="{_escape(value)}",' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REQUEST_SECONDS = Histogram(
+    "flaskblog_request_duration_seconds", "Wall time per request.",
+    SECONDS_BUCKETS, ("endpoint", "method", "status")
+)
+REQUEST_STATEMENTS = Histogram(
+    "flaskblog_request_sql_statements", "SQL statements executed per request.",
+    COUNT_BUCKETS, ("endpoint",)
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "flaskblog_request_sql_seconds", "Time spent in SQL per request.",
+    SECONDS_BUCKETS, ("endpoint",)
+)
+REQUEST_TEMPLATE_SECONDS = Histogram(
+    "flaskblog_request_template_seconds", "Time spent rendering templates per request.",
+    SECONDS_BUCKETS, ("endpoint",)
+)
+SLOW_QUERIES = Counter(
+    "flaskblog_slow_queries_total", "SQL statements slower than SLOW_QUERY_MS."
+)
+RATE_LIMITED = Counter(
+    "flaskblog_rate_limited_total", "Requests answered 429 by flaskblog.ratelimit."
+)
+
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_STATEMENTS, REQUEST_SQL_SECONDS, REQUEST_TEMPLATE_SECONDS)
+
+
+# ---------------- SQL ----------------
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "metrics_started", None)
+    if started is None or not has_app_context():
+        return
+    elapsed = time.perf_counter() - started
+
+    stats = g.get("request_metrics")
+    if stats is not None:
+        stats["statements"] += 1
+        stats["sql"] += elapsed
+
+    threshold = current_app.config["SLOW_QUERY_MS"]
+    if threshold and elapsed * 1000 >= threshold:
+        SLOW_QUERIES.inc()
+        # values include password hashes, emails and the token links
+        # queued in mail_outbox, so only their types are logged
+        params = parameters if current_app.config["SLOW_QUERY_LOG_PARAMS"] \
+            else _parameter_types(parameters, executemany)
+        logger.warning("Slow query (%.1f ms): %s | params: %.500r",
+                       elapsed * 1000, " ".join(statement.split()), params)
+
+
+def _parameter_types(parameters, executemany):
+    """Shape of the bound parameters without their values."""
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} rows of {_parameter_types(rows[0], False)}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return tuple(type(value).__name__ for value in parameters or ())
+
+
+# ---------------- TEMPLATES ----------------
+# post cards are rendered from inside page templates, so only the
+# outermost render on the stack is timed
+def _template_started(sender, template, context, **extra):
+    stats = g.get("request_metrics")
+    if stats is not None:
+        stats["templates"].append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    stats = g.get("request_metrics")
+    if stats is not None and stats["templates"]:
+        started = stats["templates"].pop()
+        if not stats["templates"]:
+            stats["template"] += time.perf_counter() - started
+
+
+# ---------------- REQUESTS ----------------
+def _request_started():
+    g.request_metrics = {
+        "started": time.perf_counter(),
+        "statements": 0,
+        "sql": 0.0,
+        "template": 0.0,
+        "templates": [],
+    }
+
+
+def _request_finished(response):
+    _record(response.status_code)
+    return response
+
+
+def _request_torn_down(error):
+    # after_request does not run when a view raised
+    if error is not None:
+        _record(500)
+
+
+def _record(status):
+    stats = g.pop("request_metrics", None)
+    if stats is None:
+        return
+    endpoint = request.endpoint or "<unmatched>"
+    if endpoint == "metrics.metrics":
+        return
+    REQUEST_SECONDS.observe(time.perf_counter() - stats["started"], endpoint, request.method, status)
+    REQUEST_STATEMENTS.observe(stats["statements"], endpoint)
+    REQUEST_SQL_SECONDS.observe(stats["sql"], endpoint)
+    REQUEST_TEMPLATE_SECONDS.observe(stats["template"], endpoint)
+
+
+# ---------------- /metrics ----------------
+bp = Blueprint("metrics", __name__)
+
+
+def require_metrics_token():
+    """403 unless the request carries METRICS_TOKEN (when one is set)."""
+    token = current_app.config["METRICS_TOKEN"]
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            abort(403)
+
+
+@bp.route("/metrics")
+def metrics():
+    require_metrics_token()
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(SLOW_QUERIES.render())
+    lines.extend(RATE_LIMITED.render())
+    lines.extend(_gauges())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def _gauges():
+    from flaskblog.fragments import fragment_cache
+    from flaskblog.likebuffer import like_buffer
+
+    stats = fragment_cache.stats()
+    values = [
+        ("flaskblog_fragment_cache_entries", "gauge", stats["entries"]),
+        ("flaskblog_fragment_cache_bytes", "gauge", stats["bytes"]),
+        ("flaskblog_fragment_cache_hits_total", "counter", stats["hits"]),
+        ("flaskblog_fragment_cache_misses_total", "counter", stats["misses"]),
+        ("flaskblog_fragment_cache_evictions_total", "counter", stats["evictions"]),
+        ("flaskblog_like_buffer_pending", "gauge", like_buffer.pending()),
+    ]
+    lines = []
+    for name, kind, value in values:
+        lines.extend([f"# TYPE {name} {kind}", f"{name} {value}"])
+    return lines
+
+
+def init_app(app):
+    if not app.config["METRICS_ENABLED"]:
+        return
+    app.before_request(_request_started)
+    app.after_request(_request_finished)
+    app.teardown_request(_request_torn_down)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.register_blueprint(bp)
@@ -1,16 +1,14 @@
 from datetime import datetime
 from flask import current_app
 from itsdangerous import Serializer
-from sqlalchemy import desc, UniqueConstraint
-from flaskblog import db, bcrypt, login_manager
+from sqlalchemy import delete, desc, func, select, UniqueConstraint
+from flaskblog import db
+from flaskblog.passwords import hash_password, matches_any
 from flask_login import UserMixin
 
 # -------------------------------------------------
-# Flask-Login Loader
+# Flask-Login Loader: see flaskblog/usercache.py
 # -------------------------------------------------
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
 
 # -------------------------------------------------
 # USER MODEL
@@ -27,6 +25,33 @@ class User(db.Model, UserMixin):
     password_history = db.relationship("PasswordHistory", backref="user", lazy=True)
     comments = db.relationship("Comment", backref="user", lazy=True)
 
+    # case-insensitive availability checks (User.taken)
+    __table_args__ = (
+        db.Index("ix_user_lower_username", func.lower(username)),
+        db.Index("ix_user_lower_email", func.lower(email)),
+    )
+
+    @classmethod
+    def taken(cls, username=None, email=None, exclude_id=None):
+        """Which of ``username``/``email`` another account already uses.
+
+        Compares case-insensitively and answers both in one query of two
+        EXISTS, each served by its lower() index.
+        """
+        checks = {}
+        for name, column, value in (("username", cls.username, username),
+                                    ("email", cls.email, email)):
+            if value is None:
+                continue
+            query = select(cls.id).where(func.lower(column) == func.lower(value))
+            if exclude_id is not None:
+                query = query.where(cls.id != exclude_id)
+            checks[name] = query.exists().label(name)
+        if not checks:
+            return set()
+        row = db.session.execute(select(*checks.values())).one()
+        return {name for name, hit in zip(checks, row) if hit}
+
     # ---------------- TOKEN HELPERS ----------------
     def get_verification_token(self, expires_sec=1800):
         s = Serializer(current_app.config["SECRET_KEY"])
@@ -68,25 +93,31 @@ class User(db.Model, UserMixin):
             return None
         return User.query.get(user_id)
 
-    def update_password_history(self, new_password):
-        hashed = bcrypt.generate_password_hash(new_password).decode("utf-8")
-        self.password_history.append(
-            PasswordHistory(user_id=self.id, password_hash=hashed)
-        )
-        db.session.commit()
+    def set_password(self, new_password):
+        """Hash and store a new password and record it in the history.
+
+        The history is pruned to PASSWORD_HISTORY_SIZE entries in the
+        same transaction. Caller commits.
+        """
+        self.password = hash_password(new_password)
+        self.update_password_history(self.password)
+
+    def update_password_history(self, password_hash):
+        db.session.add(PasswordHistory(user_id=self.id, password_hash=password_hash))
+        db.session.flush()
+        PasswordHistory.prune(current_app.config["PASSWORD_HISTORY_SIZE"], self.id)
 
     def check_password_history(self, candidate_password):
-        recent = (
-            PasswordHistory.query
-            .filter_by(user_id=self.id)
-            .order_by(desc(PasswordHistory.timestamp))
-            .limit(5)
-            .all()
-        )
-        for entry in recent:
-            if bcrypt.check_password_hash(entry.password_hash, candidate_password):
-                return True
-        return False
+        """True if the candidate is the current or a recent password."""
+        recent = db.session.scalars(
+            select(PasswordHistory.password_hash)
+            .where(PasswordHistory.user_id == self.id)
+            .order_by(desc(PasswordHistory.timestamp), desc(PasswordHistory.id))
+            .limit(current_app.config["PASSWORD_HISTORY_SIZE"])
+        ).all()
+        # the current hash is usually the newest entry, check it once
+        hashes = dict.fromkeys([self.password, *recent])
+        return matches_any(hashes, candidate_password)
 
 # -------------------------------------------------
 # POST MODEL
@@ -94,12 +125,26 @@ class User(db.Model, UserMixin):
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
-    date_posted = db.Column(db.DateTime, default=datetime.utcnow)
+    date_posted = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     content = db.Column(db.Text, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
 
+    # version stamp for caches: bumped by every UPDATE, counters included
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # denormalized counters, maintained by flaskblog.counters
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
     comments = db.relationship("Comment", backref="post", lazy=True)
 
+    # keyset pagination seeks on (date_posted, id); a user's page
+    # does the same within one author
+    __table_args__ = (
+        db.Index("ix_post_date_posted_id", "date_posted", "id"),
+        db.Index("ix_post_user_id_date_posted_id", "user_id", "date_posted", "id"),
+    )
+
 # -------------------------------------------------
 # PASSWORD HISTORY
 # -------------------------------------------------
@@ -109,6 +154,32 @@ class PasswordHistory(db.Model):
     password_hash = db.Column(db.String(60), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # newest entries of one user (check_password_history)
+    __table_args__ = (
+        db.Index("ix_password_history_user_id_timestamp", "user_id", "timestamp"),
+    )
+
+    @classmethod
+    def prune(cls, keep, user_id=None):
+        """Delete all but the ``keep`` newest entries per user (one user or all).
+
+        Returns the number of rows deleted. Caller commits.
+        """
+        rank = func.row_number().over(
+            partition_by=cls.user_id,
+            order_by=(desc(cls.timestamp), desc(cls.id))
+        )
+        ranked = select(cls.id, rank.label("rank"))
+        if user_id is not None:
+            ranked = ranked.where(cls.user_id == user_id)
+        ranked = ranked.subquery()
+        result = db.session.execute(
+            delete(cls)
+            .where(cls.id.in_(select(ranked.c.id).where(ranked.c.rank > keep)))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
 # -------------------------------------------------
 # POST LIKE
 # -------------------------------------------------
@@ -120,6 +191,8 @@ class PostLike(db.Model):
 
     __table_args__ = (
         UniqueConstraint("user_id", "post_id", name="unique_user_post_like"),
+        # the unique constraint leads with user_id; likes of one post
+        db.Index("ix_post_like_post_id", "post_id"),
     )
 
 # -------------------------------------------------
@@ -134,3 +207,26 @@ class Comment(db.Model):
 
     parent_id = db.Column(db.Integer, db.ForeignKey("comment.id"), nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # top-level threads of a post in order (parent_id IS NULL)
+        db.Index("ix_comment_post_id_parent_id_timestamp", "post_id", "parent_id", "timestamp", "id"),
+        # replies of a comment (recursive thread CTE, reply counts)
+        db.Index("ix_comment_parent_id", "parent_id"),
+        db.Index("ix_comment_user_id", "user_id"),
+    )
+
+# -------------------------------------------------
+# MAIL OUTBOX (durable mail queue backend)
+# -------------------------------------------------
+class MailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="pending", server_default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    not_before = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_mail_outbox_status_not_before", "status", "not_before"),
+    )
@@ -0,0 +1,152 @@
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+# =====================================================
+# KEYSET (CURSOR) PAGINATION
+#
+# OFFSET pagination makes the database walk and throw
+# away every row before the requested page and runs a
+# COUNT(*) on each request. Keyset pagination seeks
+# straight to (date_posted, id) through the composite
+# index, so every page costs the same.
+# =====================================================
+
+CURSOR_SEPARATOR = "~"
+
+
+def encode_cursor(post):
+    return f"{post.date_posted.isoformat()}{CURSOR_SEPARATOR}{post.id}"
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        date_str, id_str = cursor.rsplit(CURSOR_SEPARATOR, 1)
+        return datetime.fromisoformat(date_str), int(id_str)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """One page of posts plus the cursors needed to move older/newer."""
+
+    keyset = True
+
+    def __init__(self, items, has_older, has_newer, total=None):
+        self.items = items
+        self.has_older = has_older
+        self.has_newer = has_newer
+        self.total = total
+
+    @property
+    def older_cursor(self):
+        if self.has_older and self.items:
+            return encode_cursor(self.items[-1])
+        return None
+
+    @property
+    def newer_cursor(self):
+        if self.has_newer and self.items:
+            return encode_cursor(self.items[0])
+        return None
+
+
+def keyset_paginate(query, date_column, id_column, before=None, after=None,
+                    per_page=5, total=None):
+    """Return a KeysetPage for ``query`` ordered newest first.
+
+    ``before`` walks to older posts, ``after`` walks back to newer ones.
+    Both are cursors produced by ``encode_cursor``.
+    """
+    key = tuple_(date_column, id_column)
+    before_key = decode_cursor(before)
+    after_key = decode_cursor(after)
+
+    if after_key:
+        rows = (
+            query.filter(key > tuple_(*after_key))
+            .order_by(date_column.asc(), id_column.asc())
+            .limit(per_page + 1)
+            .all()
+        )
+        has_newer = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(items, has_older=True, has_newer=has_newer, total=total)
+
+    if before_key:
+        query = query.filter(key < tuple_(*before_key))
+
+    rows = (
+        query.order_by(date_column.desc(), id_column.desc())
+        .limit(per_page + 1)
+        .all()
+    )
+    has_older = len(rows) > per_page
+    return KeysetPage(
+        rows[:per_page],
+        has_older=has_older,
+        has_newer=before_key is not None,
+        total=total
+    )
+
+# =====================================================
+# APPROXIMATE TOTALS
+#
+# Totals are only informational in keyset mode, so the
+# COUNT(*) result is cached per key for a short TTL.
+# Keys include user ids, so the cache is an LRU of at
+# most COUNT_CACHE_SIZE entries, one per application.
+# =====================================================
+
+COUNT_CACHE_SIZE = 1024
+
+
+class CountCache:
+
+    def __init__(self, max_entries=COUNT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._data.get(key)
+            if cached and cached[1] > now:
+                self._data.move_to_end(key)
+                return cached[0]
+        return None
+
+    def set(self, key, total, ttl):
+        with self._lock:
+            self._data[key] = (total, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+def init_app(app):
+    app.extensions["count_cache"] = CountCache()
+
+
+def cached_count(key, query):
+    ttl = current_app.config.get("PAGINATION_COUNT_TTL", 0)
+    if ttl <= 0:
+        return None
+
+    cache = current_app.extensions["count_cache"]
+    total = cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total, ttl)
+    return total
+
+
+def use_keyset_pagination():
+    return current_app.config.get("PAGINATION_MODE") == "keyset"
@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+
+from flask import current_app
+
+from flaskblog import bcrypt
+
+# =====================================================
+# PASSWORD HASHING SERVICE
+#
+# All bcrypt work goes through here so the cost factor
+# lives in one place (BCRYPT_LOG_ROUNDS) and so several
+# hashes can be checked at once: bcrypt releases the GIL,
+# so a small thread pool gives real parallelism for the
+# password-history check.
+# =====================================================
+
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _executor_size
+    size = current_app.config["PASSWORD_HASH_WORKERS"]
+    if _executor is None or _executor_size != size:
+        with _executor_lock:
+            if _executor is None or _executor_size != size:
+                if _executor is not None:
+                    _executor.shutdown(wait=False)
+                _executor = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix="bcrypt"
+                )
+                _executor_size = size
+    return _executor
+
+
+def hash_password(password):
+    return bcrypt.generate_password_hash(
+        password, current_app.config["BCRYPT_LOG_ROUNDS"]
+    ).decode("utf-8")
+
+
+def check_password(password_hash, password):
+    return bcrypt.check_password_hash(password_hash, password)
+
+
+def matches_any(password_hashes, password):
+    """True if ``password`` matches any of the hashes, checked in parallel."""
+    password_hashes = list(password_hashes)
+    if len(password_hashes) <= 1:
+        return any(check_password(h, password) for h in password_hashes)
+
+    futures = [_pool().submit(check_password, h, password) for h in password_hashes]
+    try:
+        for future in as_completed(futures):
+            if future.result():
+                return True
+        return False
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def hash_cost(password_hash):
+    # $2b$12$<salt+hash>
+    try:
+        return int(password_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != current_app.config["BCRYPT_LOG_ROUNDS"]
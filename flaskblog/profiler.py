@@ -0,0 +1,151 @@
+import cProfile
+from collections import Counter
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# ON-DEMAND REQUEST PROFILER
+#
+# Off unless PROFILE_DIR is set. Even then a request is
+# only profiled when it carries a signed token
+# (X-Profile-Token header or ?_profile=...), minted with
+# "flask profile-token". Output lands in PROFILE_DIR:
+#
+#   PROFILE_MODE=cprofile -> <time>-<endpoint>.prof
+#       (pstats: python -m pstats, snakeviz)
+#   PROFILE_MODE=sample   -> <time>-<endpoint>.collapsed
+#       (collapsed stacks: flamegraph.pl, speedscope)
+#
+# The sampler reads the request thread's stack every
+# PROFILE_SAMPLE_MS from a side thread, so the profiled
+# request itself runs at almost full speed.
+# =====================================================
+
+TOKEN_SALT = "request-profiler"
+HEADER = "X-Profile-Token"
+QUERY_ARG = "_profile"
+
+# cProfile can only be active once per process
+_cprofile_lock = threading.Lock()
+
+
+def make_token(endpoint=None):
+    """Token enabling profiling for ``endpoint`` (None = any endpoint)."""
+    serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=TOKEN_SALT)
+    return serializer.dumps({"endpoint": endpoint})
+
+
+def _token_allows(token):
+    serializer = URLSafeTimedSerializer(current_app.config["SECRET_KEY"], salt=TOKEN_SALT)
+    try:
+        data = serializer.loads(token, max_age=current_app.config["PROFILE_TOKEN_MAX_AGE"])
+    except BadSignature:
+        return False
+    return data.get("endpoint") in (None, request.endpoint)
+
+
+class StackSampler:
+    """Collects collapsed stacks of one thread at a fixed interval."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def dump(self, path):
+        with open(path, "w") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+
+def _start():
+    token = request.headers.get(HEADER) or request.args.get(QUERY_ARG)
+    if not token or not _token_allows(token):
+        return
+
+    if current_app.config["PROFILE_MODE"] == "sample":
+        interval = current_app.config["PROFILE_SAMPLE_MS"] / 1000
+        g.profiler = StackSampler(threading.get_ident(), interval).start()
+    elif _cprofile_lock.acquire(blocking=False):
+        profile = cProfile.Profile()
+        profile.enable()
+        g.profiler = profile
+    else:
+        logger.info("Profiler busy, not profiling %s", request.path)
+        return
+    g.profile_started = time.perf_counter()
+
+
+def _finish(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+
+    elapsed_ms = (time.perf_counter() - g.profile_started) * 1000
+    directory = current_app.config["PROFILE_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    endpoint = re.sub(r"[^\w.-]", "_", request.endpoint or "unmatched")
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{elapsed_ms:.0f}ms")
+
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+        path = base + ".collapsed"
+        profiler.dump(path)
+    else:
+        profiler.disable()
+        _cprofile_lock.release()
+        path = base + ".prof"
+        profiler.dump_stats(path)
+
+    response.headers["X-Profile-File"] = os.path.basename(path)
+    logger.info("Profiled %s in %.0f ms -> %s", request.path, elapsed_ms, path)
+    return response
+
+
+def _abandon(error):
+    # the view raised before after_request could stop the profiler
+    profiler = g.pop("profiler", None)
+    if isinstance(profiler, StackSampler):
+        profiler.stop()
+    elif profiler is not None:
+        profiler.disable()
+        _cprofile_lock.release()
+
+
+def init_app(app):
+    # nothing is hooked in unless profiling is configured
+    if not app.config["PROFILE_DIR"]:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_abandon)
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from functools import wraps
+import logging
+
+from flask import current_app, g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# SQL STATEMENT COUNTING
+#
+# Every statement executed while a counter is active on
+# flask.g is tallied. Used to hold routes to a fixed
+# statement budget so N+1 lazy loads show up as errors
+# in tests instead of as slow pages in production.
+# =====================================================
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and g.get("query_counter") is not None:
+        g.query_counter.append(statement)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def count_queries():
+    """Collect the statements executed inside the block into a list."""
+    previous = g.get("query_counter")
+    statements = []
+    g.query_counter = statements
+    try:
+        yield statements
+    finally:
+        g.query_counter = previous
+        if previous is not None:
+            previous.extend(statements)
+
+
+def query_budget(max_statements):
+    """Fail (QUERY_BUDGET_ENFORCE) or warn when a view runs more statements.
+
+    The budget covers the whole view, including template rendering,
+    which is where lazy relationship loads happen.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            with count_queries() as statements:
+                response = view(*args, **kwargs)
+
+            if len(statements) > max_statements:
+                message = (
+                    f"{view.__name__} ran {len(statements)} SQL statements "
+                    f"(budget {max_statements})"
+                )
+                if current_app.config.get("QUERY_BUDGET_ENFORCE"):
+                    raise QueryBudgetExceeded(message + ":\n" + "\n".join(statements))
+                logger.warning(message)
+
+            return response
+        return wrapped
+    return decorator
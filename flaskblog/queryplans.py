@@ -0,0 +1,173 @@
+import json
+import re
+
+from flask import current_app
+from sqlalchemy import desc, event, func, select, text
+from sqlalchemy.engine import Engine
+
+from flaskblog import db
+from flaskblog.models import User, Post, PostLike, Comment, PasswordHistory
+
+# =====================================================
+# QUERY PLAN CHECK (flask check-query-plans)
+#
+# Requests the hot read pages through the test client
+# and runs the lookups behind likes, counters and the
+# password history, recording every statement. Then
+# EXPLAINs each one and reports those that read a whole
+# table instead of an index:
+#
+#   SQLite:     EXPLAIN QUERY PLAN, any "SCAN <table>",
+#               also when it walks a whole index
+#   PostgreSQL: EXPLAIN (FORMAT JSON) with enable_seqscan
+#               off, so a "Seq Scan" left in the plan means
+#               no usable index exists (on small tables
+#               the planner would otherwise rightly pick
+#               one anyway); index scans without an index
+#               condition count too
+#
+# Needs some data to pick real ids from (flask seed)
+# and a SECRET_KEY, the pages are requested logged in.
+# =====================================================
+
+# (label, table) pairs that may walk a whole table or index: the
+# home feed reads ix_post_date_posted_id in order up to its LIMIT,
+# and its total is a full count (cached, see cached_count)
+ALLOWED_SCANS = {("home", "post"), ("home page 2", "post")}
+
+# "SCAN post", "SCAN post USING INDEX ...", "SCAN comment_2" (alias)
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+?)(?:_\d+)?(?: AS \w+)?(?: USING (?:COVERING )?INDEX \w+)?$")
+
+
+def _samples():
+    """Ids and names the checked requests and queries use."""
+    row = db.session.execute(
+        select(Comment.post_id, Comment.parent_id).where(Comment.parent_id.is_not(None)).limit(1)
+    ).first() or db.session.execute(select(Comment.post_id, Comment.id).limit(1)).first()
+    if row is None:
+        return None
+    post_id, comment_id = row
+    user_id, username = db.session.execute(
+        select(User.id, User.username).join(Post, Post.user_id == User.id).where(Post.id == post_id)
+    ).one()
+    return {"post_id": post_id, "comment_id": comment_id, "user_id": user_id, "username": username}
+
+
+def _pages(sample):
+    return {
+        "home": "/home",
+        "home page 2": "/home?page=2",
+        "post": f"/post/{sample['post_id']}",
+        "comment_thread": f"/post/{sample['post_id']}/comments/{sample['comment_id']}",
+        "user_posts": f"/user/{sample['username']}",
+        "search": "/search?q=post",
+    }
+
+
+def _lookups(sample):
+    """Model-level queries of the write paths, run as plain SELECTs."""
+    user_id, post_id = sample["user_id"], sample["post_id"]
+    return {
+        # toggle_like() / like_buffer: the user's like on a post
+        "like lookup": select(PostLike.id).where(
+            PostLike.user_id == user_id, PostLike.post_id == post_id
+        ),
+        # reconcile_counters(): per-post counts
+        "post like count": select(func.count(PostLike.id)).where(PostLike.post_id == post_id),
+        "post comment count": select(func.count(Comment.id)).where(Comment.post_id == post_id),
+        # User.taken(): registration / account availability
+        "account availability": select(
+            select(User.id).where(func.lower(User.username) == func.lower(sample["username"]))
+            .where(User.id != user_id).exists(),
+            select(User.id).where(func.lower(User.email) == func.lower(f"{sample['username']}@example.com"))
+            .where(User.id != user_id).exists(),
+        ),
+        # User.check_password_history()
+        "password history": select(PasswordHistory.password_hash)
+        .where(PasswordHistory.user_id == user_id)
+        .order_by(desc(PasswordHistory.timestamp), desc(PasswordHistory.id))
+        .limit(current_app.config["PASSWORD_HISTORY_SIZE"]),
+    }
+
+
+def capture(sample):
+    """Run the checked requests/queries. Returns [(label, statement, parameters)]."""
+    captured = []
+    label = None
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if label and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((label, statement, parameters))
+
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        # logged in, so the anonymous page cache does not hide queries
+        session["_user_id"] = str(sample["user_id"])
+        session["_fresh"] = True
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        for label, path in _pages(sample).items():
+            response = client.get(path)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {path} answered {response.status_code}")
+        for label, statement in _lookups(sample).items():
+            db.session.execute(statement).all()
+    finally:
+        label = None
+        event.remove(Engine, "before_cursor_execute", record)
+        db.session.rollback()
+    return captured
+
+
+def full_scans(statement, parameters):
+    """Tables the plan of ``statement`` reads in full."""
+    conn = db.session.connection()
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        plan = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        scans = []
+        for row in plan:
+            match = _SQLITE_SCAN.match(row[-1])
+            if match and match.group(1) in db.metadata.tables:
+                scans.append(match.group(1))
+        return scans
+
+    if dialect == "postgresql":
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        raw = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        plan = raw if isinstance(raw, list) else json.loads(raw)
+        scans = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            full = node["Node Type"] == "Seq Scan" or (
+                node["Node Type"] in ("Index Scan", "Index Only Scan") and "Index Cond" not in node
+            )
+            if full and node.get("Relation Name") in db.metadata.tables:
+                scans.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", ()))
+        return scans
+
+    raise RuntimeError(f"No plan check for {dialect}")
+
+
+def check_query_plans():
+    """Returns (statements checked, [(label, table, statement)] of full scans)."""
+    sample = _samples()
+    if sample is None:
+        raise RuntimeError("No comments to build the checks from; run flask seed first.")
+
+    seen, problems = set(), []
+    try:
+        for label, statement, parameters in capture(sample):
+            key = " ".join(statement.split())
+            if key in seen:
+                continue
+            seen.add(key)
+            for table in full_scans(statement, parameters):
+                if (label, table) not in ALLOWED_SCANS:
+                    problems.append((label, table, key))
+    finally:
+        db.session.rollback()
+    return len(seen), problems
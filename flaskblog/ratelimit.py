@@ -0,0 +1,282 @@
+from collections import OrderedDict
+from functools import lru_cache, wraps
+import logging
+import math
+import re
+import threading
+import time
+
+from flask import current_app, render_template, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+from flaskblog.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# =====================================================
+# RATE LIMITING
+#
+# @rate_limit("login", by_ip) answers 429 (with a
+# Retry-After header) once a client goes over
+# RATELIMIT_LOGIN on that view. Only POSTs count, so
+# forms can still be displayed.
+#
+# RATELIMIT_STRATEGY:
+#   "token_bucket"   -> bursts up to the limit, then
+#                       refills evenly over the period
+#   "sliding_window" -> weighted count of the current
+#                       and previous window
+#
+# RATELIMIT_BACKEND:
+#   "memory" -> per-process, LRU-bounded (default); with
+#               several workers each one counts alone
+#   "shared" -> redis-compatible server (RATELIMIT_URL),
+#               one atomic Lua script per hit; without a
+#               URL an in-memory stand-in runs the same
+#               code path
+#   "none"   -> disabled
+#
+# A shared backend that cannot be reached lets requests
+# through rather than locking everyone out.
+#
+# by_ip uses request.remote_addr: behind a proxy, set
+# PROXY_FIX_X_FOR or every client shares the proxy's
+# address (and its limits).
+# =====================================================
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# "10/minute", "5 per hour", "100/10 seconds"
+_LIMIT = re.compile(r"^(\d+)\s*(?:/|per)\s*(\d*)\s*(second|minute|hour|day)s?$")
+
+
+@lru_cache(maxsize=None)
+def parse_limit(text):
+    """'10/minute' -> (10, 60.0): requests allowed per period in seconds."""
+    match = _LIMIT.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid rate limit {text!r}, expected e.g. '10/minute'")
+    count, multiple, unit = match.groups()
+    return int(count), float(int(multiple or 1) * PERIODS[unit])
+
+
+# ---------------- ALGORITHMS ----------------
+# take() is the reference implementation, used in process;
+# the Lua script does the same on a redis server, with the
+# server's clock so every node agrees on the time.
+
+class TokenBucket:
+    name = "token_bucket"
+
+    @staticmethod
+    def take(state, now, limit, period):
+        """Returns (new state, allowed, seconds until a request would be allowed)."""
+        rate = limit / period
+        tokens, stamp = state or (limit, now)
+        tokens = min(limit, tokens + max(0.0, now - stamp) * rate)
+        if tokens >= 1:
+            return (tokens - 1, now), True, 0.0
+        return (tokens, now), False, (1 - tokens) / rate
+
+    script = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local rate = limit / period
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = limit
+if state[1] then
+  tokens = math.min(limit, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+end
+local allowed, retry = 0, (1 - tokens) / rate
+if tokens >= 1 then
+  tokens, allowed, retry = tokens - 1, 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+-- a bucket left alone for a period is full again, same as no key
+redis.call('PEXPIRE', KEYS[1], math.ceil(period * 1000))
+return {allowed, tostring(retry)}
+"""
+
+
+class SlidingWindow:
+    name = "sliding_window"
+
+    @staticmethod
+    def take(state, now, limit, period):
+        """Returns (new state, allowed, seconds until a request would be allowed)."""
+        window, elapsed = divmod(now / period, 1)
+        current = previous = 0
+        if state:
+            last, last_current, last_previous = state
+            if last == window:
+                current, previous = last_current, last_previous
+            elif last == window - 1:
+                previous = last_current
+        if previous * (1 - elapsed) + current + 1 <= limit:
+            return (window, current + 1, previous), True, 0.0
+        # the previous window's weight fades out linearly; when that
+        # alone cannot make room, wait at least for the next window
+        room = limit - 1 - current
+        if previous and room >= 0:
+            retry = (1 - room / previous - elapsed) * period
+        else:
+            retry = (1 - elapsed) * period
+        return (window, current, previous), False, retry
+
+    script = """
+local limit = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local window = math.floor(now / period)
+local elapsed = now / period - window
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local last = tonumber(state[1])
+local current, previous = 0, 0
+if last == window then
+  current, previous = tonumber(state[2]), tonumber(state[3])
+elseif last == window - 1 then
+  previous = tonumber(state[2])
+end
+if previous * (1 - elapsed) + current + 1 <= limit then
+  redis.call('HSET', KEYS[1], 'window', window, 'current', current + 1, 'previous', previous)
+  redis.call('PEXPIRE', KEYS[1], math.ceil(period * 2000))
+  return {1, '0'}
+end
+local room = limit - 1 - current
+local retry = (1 - elapsed) * period
+if previous > 0 and room >= 0 then
+  retry = (1 - room / previous - elapsed) * period
+end
+return {0, tostring(retry)}
+"""
+
+
+ALGORITHMS = {algorithm.name: algorithm for algorithm in (TokenBucket, SlidingWindow)}
+
+
+# ---------------- BACKENDS ----------------
+class MemoryBackend:
+    """Per-process state; evicting a key only resets its limit."""
+
+    def __init__(self, algorithm, max_keys):
+        self.algorithm = algorithm
+        self.max_keys = max_keys
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        now = time.monotonic()
+        with self._lock:
+            state, allowed, retry = self.algorithm.take(self._data.get(key), now, limit, period)
+            self._data[key] = state
+            self._data.move_to_end(key)
+            if len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        return allowed, retry
+
+
+class StandInClient:
+    """Minimal in-memory stand-in for the redis client API used below.
+
+    Scripts are run as their algorithm's take(), under a lock, which is
+    what the server guarantees for the Lua version.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def register_script(self, source):
+        algorithm = next(a for a in ALGORITHMS.values() if a.script == source)
+
+        def run(keys, args):
+            limit, period = int(args[0]), float(args[1])
+            with self._lock:
+                state, allowed, retry = algorithm.take(
+                    self._data.get(keys[0]), time.time(), limit, period
+                )
+                self._data[keys[0]] = state
+            return [int(allowed), str(retry).encode()]
+        return run
+
+
+class SharedBackend:
+    """State kept on a redis-compatible server, shared by every worker."""
+
+    def __init__(self, client, algorithm, prefix="flaskblog:ratelimit:"):
+        self.script = client.register_script(algorithm.script)
+        self.prefix = prefix
+
+    def hit(self, key, limit, period):
+        try:
+            allowed, retry = self.script(keys=[self.prefix + key], args=[limit, period])
+        except Exception:
+            logger.warning("Rate limit backend unavailable, request allowed", exc_info=True)
+            return True, 0.0
+        return bool(int(allowed)), float(retry)
+
+
+def _make_backend(app):
+    kind = app.config["RATELIMIT_BACKEND"]
+    if kind == "none":
+        return None
+    algorithm = ALGORITHMS[app.config["RATELIMIT_STRATEGY"]]
+    if kind == "shared":
+        url = app.config.get("RATELIMIT_URL")
+        if url:
+            import redis  # optional dependency, only needed for a real shared backend
+            client = redis.Redis.from_url(url)
+        else:
+            client = StandInClient()
+        return SharedBackend(client, algorithm)
+    return MemoryBackend(algorithm, app.config["RATELIMIT_MAX_KEYS"])
+
+
+def init_app(app):
+    app.extensions["rate_limiter"] = _make_backend(app)
+    app.register_error_handler(429, _too_many_requests)
+
+
+def _too_many_requests(error):
+    return render_template("errors/429.html"), 429, {"Retry-After": str(error.retry_after)}
+
+
+# ---------------- KEYS ----------------
+def by_ip():
+    return "ip:" + (request.remote_addr or "unknown")
+
+
+def by_user():
+    """The logged-in user, else the client address."""
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    return by_ip()
+
+
+# ---------------- DECORATOR ----------------
+def rate_limit(name, key=by_ip, methods=("POST",)):
+    """Answer 429 once ``key()`` goes over RATELIMIT_<NAME> on this view.
+
+    An empty RATELIMIT_<NAME> turns the limit off. Put it below
+    @login_required when limiting by_user.
+    """
+    setting = "RATELIMIT_" + name.upper()
+
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            backend = current_app.extensions.get("rate_limiter")
+            text = current_app.config[setting]
+            if backend is not None and text and request.method in methods:
+                limit, period = parse_limit(text)
+                allowed, retry = backend.hit(f"{name}:{key()}", limit, period)
+                if not allowed:
+                    RATE_LIMITED.inc()
+                    raise TooManyRequests(retry_after=max(1, math.ceil(retry)))
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
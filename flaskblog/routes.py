@@ -1,169 +1,249 @@
-import os
-import secrets
-from PIL import Image
+import logging
 
-from flask import render_template, url_for, flash, redirect, request, abort
+from flask import (
+    Blueprint, current_app, render_template, url_for, flash, redirect, request, abort, jsonify
+)
 from flask_login import login_user, current_user, logout_user, login_required
-from flask_mail import Message
-from psycopg import logger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-from flaskblog import app, db, bcrypt, mail
+from flaskblog import db
 from flaskblog.forms import (
     RegistrationForm, LoginForm,
-    UpdateAccountForm, PostForm,
-    RequestResetForm, ResetPasswordForm
+    UpdateAccountForm, DeleteAccountForm, PostForm,
+    RequestResetForm, ResetPasswordForm, check_available
 )
-from flaskblog.models import User, Post, PostLike, Comment
+from flaskblog.models import User, Post, Comment
+from flaskblog.counters import toggle_like, bump_comment_count
+from flaskblog.likebuffer import like_buffer
+from flaskblog.comments import comment_threads, comment_replies
+from flaskblog.search import search_posts, index_post
+from flaskblog.deletion import delete_posts, delete_user
+from flaskblog.mailqueue import enqueue_mail
+from flaskblog.passwords import hash_password, check_password, needs_rehash
+from flaskblog.images import save_profile_picture, collect_orphans, avatar_url
+from flaskblog.fragments import cache_anonymous_page, invalidate_post, invalidate_posts, fragment_cache
+from flaskblog.usercache import invalidate_user
+from flaskblog.conditional import comment_versions, conditional, feed_versions, post_versions
+from flaskblog.pagination import keyset_paginate, cached_count, use_keyset_pagination
+from flaskblog.querycount import query_budget
+from flaskblog.database import read_replica
+from flaskblog.ratelimit import rate_limit, by_ip, by_user
+from flaskblog.metrics import require_metrics_token
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("main", __name__)
 
 # ==================================================
 # HELPERS
 # ==================================================
-def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(app.root_path, "static/profile_pics", picture_fn)
-
-    img = Image.open(form_picture)
-    img.thumbnail((125, 125))
-    img.save(picture_path)
-
-    return picture_fn
-
-
 def send_verification_email(user):
     try:
         token = user.get_verification_token()
-
-        msg = Message(
+        enqueue_mail(
             "Verify Your Email",
-            sender=app.config.get("MAIL_DEFAULT_SENDER"),
-            recipients=[user.email]
-        )
-
-        msg.body = f"""
+            recipients=[user.email],
+            body=f"""
 Verify your email:
-{url_for('verify_email', token=token, _external=True)}
+{url_for('main.verify_email', token=token, _external=True)}
 """
-
-        print("Before mail.send()")
-        mail.send(msg)
-        print("After mail.send()")
-
+        )
     except Exception as e:
-        print(f"MAIL ERROR: {e}")
+        logger.error(f"MAIL ERROR: {e}")
 
 
 def send_reset_email(user):
     try:
         token = user.get_reset_token()
-
-        msg = Message(
+        enqueue_mail(
             "Password Reset Request",
-            sender=app.config.get("MAIL_DEFAULT_SENDER"),
-            recipients=[user.email]
-        )
-
-        msg.body = f"""
+            recipients=[user.email],
+            body=f"""
 To reset your password visit:
-{url_for('reset_token', token=token, _external=True)}
+{url_for('main.reset_token', token=token, _external=True)}
 """
-
-        print("Before reset mail.send()")
-        mail.send(msg)
-        print("After reset mail.send()")
-
+        )
     except Exception as e:
-        print(f"RESET MAIL ERROR: {e}")
+        logger.error(f"RESET MAIL ERROR: {e}")
 
 # ==================================================
 # HOME
 # ==================================================
-@app.route("/")
-@app.route("/home")
+@bp.route("/")
+@bp.route("/home")
+@read_replica
+@cache_anonymous_page
+@query_budget(3)
 def home():
-    page = request.args.get("page", 1, type=int)
-    posts = Post.query.order_by(Post.date_posted.desc()).paginate(page=page, per_page=5)
-    return render_template("home.html", posts=posts)
+    per_page = current_app.config["POSTS_PER_PAGE"]
+
+    if use_keyset_pagination():
+        query = Post.query.options(joinedload(Post.author))
+        posts = keyset_paginate(
+            query, Post.date_posted, Post.id,
+            before=request.args.get("before"),
+            after=request.args.get("after"),
+            per_page=per_page,
+            total=cached_count("home", query)
+        )
+    else:
+        page = request.args.get("page", 1, type=int)
+        posts = Post.query.options(joinedload(Post.author))\
+            .order_by(Post.date_posted.desc())\
+            .paginate(page=page, per_page=per_page)
+
+    return conditional(
+        feed_versions(posts), None,
+        lambda: render_template("home.html", posts=posts)
+    )
 
 # ==================================================
 # SINGLE POST
 # ==================================================
-@app.route("/post/<int:post_id>")
+@bp.route("/post/<int:post_id>")
+@read_replica
+@query_budget(4)
 def post(post_id):
-    post = Post.query.get_or_404(post_id)
-    likes = PostLike.query.filter_by(post_id=post.id).count()
-    comments = Comment.query.filter_by(post_id=post.id).all()
-    return render_template("post.html", post=post, likes=likes, comments=comments)
+    post = Post.query.options(joinedload(Post.author)).get_or_404(post_id)
+    page = request.args.get("comments_page", 1, type=int)
+    # loaded up front: a commenter renaming or changing picture moves
+    # no post.updated_at, only the comments' own versions show it
+    comments = comment_threads(post.id, page)
+    return conditional(
+        (post_versions(post), page, comment_versions(comments)), None,
+        lambda: render_template("post.html", post=post, comments=comments)
+    )
+
+
+@bp.route("/post/<int:post_id>/comments/<int:comment_id>")
+@read_replica
+@query_budget(4)
+def comment_thread(post_id, comment_id):
+    post = Post.query.options(joinedload(Post.author)).get_or_404(post_id)
+    thread = comment_replies(comment_id)
+    if thread is None or thread.comment.post_id != post.id:
+        abort(404)
+    return render_template("comment_thread.html", post=post, thread=thread)
 
 # ==================================================
 # LIKE POST  🔥 FIX
 # ==================================================
-@app.route("/post/<int:post_id>/like", methods=["POST"])
+@bp.route("/post/<int:post_id>/like", methods=["POST"])
 @login_required
+@rate_limit("like", by_user)
 def like_post(post_id):
-    like = PostLike.query.filter_by(
-        user_id=current_user.id,
-        post_id=post_id
-    ).first()
-
-    if like:
-        db.session.delete(like)
-    else:
-        db.session.add(PostLike(
-            user_id=current_user.id,
-            post_id=post_id
-        ))
+    try:
+        if current_app.config["LIKE_WRITE_BEHIND"]:
+            liked = like_buffer.toggle(current_user.id, post_id)
+        else:
+            liked = toggle_like(current_user.id, post_id)
+        if liked is None:
+            db.session.rollback()
+            abort(404)
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request inserted the same like first
+        db.session.rollback()
 
-    db.session.commit()
-    return redirect(url_for("post", post_id=post_id))
+    return redirect(url_for("main.post", post_id=post_id))
 
 # ==================================================
 # ADD COMMENT  🔥 FIX
 # ==================================================
-@app.route("/post/<int:post_id>/comment", methods=["POST"])
+@bp.route("/post/<int:post_id>/comment", methods=["POST"])
 @login_required
+@rate_limit("comment", by_user)
 def add_comment(post_id):
     content = request.form.get("content")
+    parent_id = request.form.get("parent_id", type=int)
+    if parent_id is not None:
+        parent = db.session.get(Comment, parent_id)
+        if parent is None or parent.post_id != post_id:
+            abort(400)
     if content:
+        if not bump_comment_count(post_id, 1):
+            db.session.rollback()
+            abort(404)
         db.session.add(Comment(
             content=content,
             user_id=current_user.id,
-            post_id=post_id
+            post_id=post_id,
+            parent_id=parent_id
         ))
         db.session.commit()
-    return redirect(url_for("post", post_id=post_id))
+    return redirect(url_for("main.post", post_id=post_id))
 
 # ==================================================
 # USER POSTS
 # ==================================================
-@app.route("/user/<string:username>")
+@bp.route("/user/<string:username>")
+@read_replica
+@cache_anonymous_page
+@query_budget(4)
 def user_posts(username):
-    page = request.args.get("page", 1, type=int)
+    per_page = current_app.config["POSTS_PER_PAGE"]
     user = User.query.filter_by(username=username).first_or_404()
-    posts = Post.query.filter_by(author=user)\
-        .order_by(Post.date_posted.desc())\
-        .paginate(page=page, per_page=5)
-    return render_template("user_posts.html", posts=posts, user=user)
+
+    if use_keyset_pagination():
+        query = Post.query.filter_by(user_id=user.id).options(joinedload(Post.author))
+        posts = keyset_paginate(
+            query, Post.date_posted, Post.id,
+            before=request.args.get("before"),
+            after=request.args.get("after"),
+            per_page=per_page,
+            total=cached_count(f"user:{user.id}", query)
+        )
+    else:
+        page = request.args.get("page", 1, type=int)
+        posts = Post.query.filter_by(author=user)\
+            .options(joinedload(Post.author))\
+            .order_by(Post.date_posted.desc())\
+            .paginate(page=page, per_page=per_page)
+
+    return conditional(
+        (user.id, user.username, feed_versions(posts)), None,
+        lambda: render_template("user_posts.html", posts=posts, user=user)
+    )
+
+# ==================================================
+# SEARCH
+# ==================================================
+@bp.route("/search")
+@read_replica
+def search():
+    q = request.args.get("q", "")
+    page = request.args.get("page", 1, type=int)
+    results = search_posts(q, page)
+    return render_template("search.html", results=results, title="Search")
+
+# ==================================================
+# CACHE STATS (monitoring)
+# ==================================================
+@bp.route("/metrics/cache")
+def cache_stats():
+    require_metrics_token()
+    return jsonify(fragment_cache.stats())
 
 # ==================================================
 # ABOUT
 # ==================================================
-@app.route("/about")
+@bp.route("/about")
 def about():
     return render_template("about.html")
 
 # ==================================================
 # REGISTER
 # ==================================================
-@app.route("/register", methods=["GET", "POST"])
+@bp.route("/register", methods=["GET", "POST"])
+@rate_limit("register", by_ip)
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for("home"))
+        return redirect(url_for("main.home"))
 
     form = RegistrationForm()
     if form.validate_on_submit():
-        hashed_pw = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+        hashed_pw = hash_password(form.password.data)
         user = User(
             username=form.username.data,
             email=form.email.data,
@@ -171,83 +251,145 @@ def register():
             verified=False
         )
         db.session.add(user)
-        db.session.commit()
-        send_verification_email(user)
+        try:
+            # flushed first: the verification token needs the id, and
+            # the mail is saved with the account (mailqueue)
+            db.session.flush()
+            send_verification_email(user)
+            db.session.commit()
+        except IntegrityError:
+            # taken between validation and insert by a concurrent signup
+            db.session.rollback()
+            if check_available(form):
+                flash("Could not create the account. Please try again.", "danger")
+            return render_template("register.html", form=form)
         flash("Account created! Check your email to verify.", "info")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     return render_template("register.html", form=form)
 
 # ==================================================
 # VERIFY EMAIL
 # ==================================================
-@app.route("/verify_email/<token>")
+@bp.route("/verify_email/<token>")
 def verify_email(token):
     user = User.verify_verification_token(token)
     if not user:
         flash("Invalid or expired link.", "danger")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     user.verified = True
     db.session.commit()
     flash("Email verified successfully!", "success")
-    return redirect(url_for("login"))
+    return redirect(url_for("main.login"))
 
 # ==================================================
 # LOGIN / LOGOUT
 # ==================================================
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
+@rate_limit("login", by_ip)
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for("home"))
+        return redirect(url_for("main.home"))
 
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and check_password(user.password, form.password.data):
             if not user.verified:
                 flash("Verify email before login.", "warning")
-                return redirect(url_for("login"))
+                return redirect(url_for("main.login"))
+            if needs_rehash(user.password):
+                # cost factor changed since this hash was made
+                user.password = hash_password(form.password.data)
+                db.session.commit()
             login_user(user)
-            return redirect(url_for("home"))
+            return redirect(url_for("main.home"))
         flash("Login failed.", "danger")
 
     return render_template("login.html", form=form)
 
 
-@app.route("/logout")
+@bp.route("/logout")
 def logout():
     logout_user()
-    return redirect(url_for("home"))
+    return redirect(url_for("main.home"))
 
 # ==================================================
 # ACCOUNT
 # ==================================================
-@app.route("/account", methods=["GET", "POST"])
+@bp.route("/account", methods=["GET", "POST"])
 @login_required
 def account():
     form = UpdateAccountForm()
 
     if form.validate_on_submit():
+        previous_picture = current_user.image_file
         if form.picture.data:
-            current_user.image_file = save_picture(form.picture.data)
+            picture = save_profile_picture(form.picture.data, current_user.id)
+            if picture:
+                current_user.image_file = picture
+            else:
+                flash("Your new profile picture is being processed.", "info")
         current_user.username = form.username.data
         current_user.email = form.email.data
-        db.session.commit()
+        new_picture = current_user.image_file
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            collect_orphans([new_picture])
+            if check_available(form, current_user):
+                flash("Could not update the account. Please try again.", "danger")
+            return render_account(form)
+        if current_user.image_file != previous_picture:
+            collect_orphans([previous_picture])
         flash("Account updated!", "success")
-        return redirect(url_for("account"))
+        return redirect(url_for("main.account"))
 
     elif request.method == "GET":
         form.username.data = current_user.username
         form.email.data = current_user.email
 
-    image_file = url_for("static", filename="profile_pics/" + current_user.image_file)
-    return render_template("account.html", image_file=image_file, form=form)
+    return render_account(form)
+
+
+def render_account(form):
+    image_file = url_for("static", filename=avatar_url(current_user.image_file))
+    return render_template(
+        "account.html", image_file=image_file, form=form, delete_form=DeleteAccountForm()
+    )
+
+
+@bp.route("/account/delete", methods=["POST"])
+@login_required
+def delete_account():
+    form = DeleteAccountForm()
+    if not form.validate_on_submit() or not check_password(current_user.password, form.password.data):
+        flash("Password incorrect, account not deleted.", "danger")
+        return redirect(url_for("main.account"))
+
+    user_id, picture = current_user.id, current_user.image_file
+    try:
+        touched = delete_user(user_id)
+        db.session.commit()
+    except Exception as e:
+        logger.error(f"Error in delete_account route: {str(e)}")
+        db.session.rollback()
+        flash("An error occurred. Please try again later.", "danger")
+        return redirect(url_for("main.account"))
+
+    logout_user()
+    invalidate_user(user_id)
+    invalidate_posts(touched)
+    collect_orphans([picture])
+    flash("Your account has been deleted.", "info")
+    return redirect(url_for("main.home"))
 
 # ==================================================
 # NEW POST
 # ==================================================
-@app.route("/post/new", methods=["GET", "POST"])
+@bp.route("/post/new", methods=["GET", "POST"])
 @login_required
 def new_post():
     form = PostForm()
@@ -261,10 +403,13 @@ def new_post():
             )
 
             db.session.add(post)
+            db.session.flush()
+            index_post(post)
             db.session.commit()
+            invalidate_post(post.id)
 
             flash("Your post has been created!", "success")
-            return redirect(url_for("home"))
+            return redirect(url_for("main.home"))
 
         except Exception as e:
             logger.error(f"Error in new_post route: {str(e)}")
@@ -279,7 +424,7 @@ def new_post():
     )
 
 # Update post route
-@app.route("/post/<int:post_id>/update", methods=['GET', 'POST'])
+@bp.route("/post/<int:post_id>/update", methods=['GET', 'POST'])
 @login_required
 def update_post(post_id):
     post = Post.query.get_or_404(post_id)
@@ -290,9 +435,11 @@ def update_post(post_id):
         try:
             post.title = form.title.data
             post.content = form.content.data
+            index_post(post)
             db.session.commit()
+            invalidate_post(post.id)
             flash('Your post has been updated!', 'success')
-            return redirect(url_for('post', post_id=post.id))
+            return redirect(url_for('main.post', post_id=post.id))
         except Exception as e:
             logger.error(f"Error in update_post route: {str(e)}")
             flash('An error occurred. Please try again later.', 'danger')
@@ -303,48 +450,58 @@ def update_post(post_id):
     return render_template('create_post.html', title='Update Post', form=form, legend='Update Post')
 
 # Delete post route 
-@app.route("/post/<int:post_id>/delete", methods=['POST'])
+@bp.route("/post/<int:post_id>/delete", methods=['POST'])
 @login_required
 def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
     if post.author != current_user:
         abort(403)
     try:
-        db.session.delete(post)
+        # likes and comments go with one DELETE each, never loaded
+        delete_posts([post.id])
         db.session.commit()
+        invalidate_post(post_id)
         flash("Post deleted!", "success")
-        return redirect(url_for("home"))
+        return redirect(url_for("main.home"))
     except Exception as e:
         logger.error(f"Error in delete_post route: {str(e)}")
         flash('An error occurred. Please try again later.', 'danger')
         db.session.rollback()
+        return redirect(url_for("main.post", post_id=post_id))
 
 # ==================================================
 # PASSWORD RESET
 # ==================================================
-@app.route("/reset_password", methods=["GET", "POST"])
+@bp.route("/reset_password", methods=["GET", "POST"])
+@rate_limit("reset_request", by_ip)
 def reset_request():
     form = RequestResetForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         send_reset_email(user)
+        db.session.commit()
         flash("Reset email sent.", "info")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
     return render_template("reset_request.html", form=form)
 
 
-@app.route("/reset_password/<token>", methods=["GET", "POST"])
+@bp.route("/reset_password/<token>", methods=["GET", "POST"])
 def reset_token(token):
     user = User.verify_reset_token(token)
     if not user:
         flash("Invalid token.", "danger")
-        return redirect(url_for("reset_request"))
+        return redirect(url_for("main.reset_request"))
 
     form = ResetPasswordForm()
+    # reuse is checked against the token's user, who is normally
+    # not logged in
     if form.validate_on_submit():
-        user.password = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+        if user.check_password_history(form.password.data):
+            form.password.errors.append("Cannot reuse an old password.")
+            return render_template("reset_token.html", form=form)
+        user.set_password(form.password.data)
         db.session.commit()
         flash("Password updated!", "success")
-        return redirect(url_for("login"))
+        return redirect(url_for("main.login"))
 
     return render_template("reset_token.html", form=form)
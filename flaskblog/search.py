@@ -0,0 +1,250 @@
+import logging
+import time
+
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import joinedload
+
+from flaskblog import db
+from flaskblog.models import Post
+
+# =====================================================
+# FULL-TEXT SEARCH
+#
+# PostgreSQL (Neon):
+#   post.search_vector is a generated tsvector column
+#   with a GIN index, so it follows every INSERT/UPDATE
+#   on its own.
+#
+# SQLite:
+#   post_fts is an FTS5 virtual table keyed by post id
+#   (rowid). index_post()/unindex_post() keep it in sync
+#   and must run in the same transaction as the write.
+#
+# Both are created by the 8b4f61d2e7a3 migration or by
+# flask search-reindex, never by a request. Until they
+# exist, and on any other backend, search falls back to
+# a LIKE scan.
+# =====================================================
+
+PG_SEARCH_DDL = [
+    "ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector "
+    "ON post USING GIN (search_vector)",
+]
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content)",
+]
+
+# engine url -> True, or the monotonic time a missing index was seen
+_ready_engines = {}
+# how long a missing index is remembered before looking again
+RECHECK_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _index_exists():
+    dialect = _dialect()
+    if dialect == "postgresql":
+        return db.session.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'post' AND column_name = 'search_vector'"
+        )).first() is not None
+    if dialect == "sqlite":
+        return db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_fts'"
+        )).first() is not None
+    return False
+
+
+def search_index_ready():
+    """True when the search structures exist. Never creates them.
+
+    Request paths only use the index when this holds; otherwise search
+    falls back to LIKE and writes skip the SQLite FTS table, which
+    rebuild_search_index() fills from the post table later.
+    """
+    engine_key = str(db.engine.url)
+    state = _ready_engines.get(engine_key)
+    if state is True:
+        return True
+    if state is not None and time.monotonic() - state < RECHECK_SECONDS:
+        return False
+
+    if _index_exists():
+        _ready_engines[engine_key] = True
+        return True
+    _ready_engines[engine_key] = time.monotonic()
+    if _dialect() in ("postgresql", "sqlite"):
+        logger.error(
+            "Full-text search index missing, searching with LIKE; "
+            "run flask db upgrade or flask search-reindex"
+        )
+    return False
+
+
+def create_search_index():
+    """Create the search structures if they are missing (migration, CLI).
+
+    Runs inside the current session transaction; returns True when it
+    created something, in which case the caller must commit. On
+    PostgreSQL this rewrites the post table under an exclusive lock, so
+    it is never called while serving requests.
+    """
+    if _dialect() not in ("postgresql", "sqlite") or _index_exists():
+        return False
+
+    if _dialect() == "postgresql":
+        ddl = PG_SEARCH_DDL
+    else:
+        ddl = SQLITE_SEARCH_DDL + [
+            "INSERT INTO post_fts (rowid, title, content) "
+            "SELECT id, title, content FROM post"
+        ]
+    for statement in ddl:
+        db.session.execute(text(statement))
+    _ready_engines.pop(str(db.engine.url), None)
+    return True
+
+
+def _fts_ready():
+    return _dialect() == "sqlite" and search_index_ready()
+
+
+def index_post(post):
+    """Add or refresh a post in the SQLite FTS table. Caller commits."""
+    if not _fts_ready():
+        return
+    unindex_post(post.id)
+    db.session.execute(
+        text("INSERT INTO post_fts (rowid, title, content) VALUES (:id, :title, :content)"),
+        {"id": post.id, "title": post.title, "content": post.content}
+    )
+
+
+def unindex_post(post_id):
+    """Remove a post from the SQLite FTS table. Caller commits."""
+    if not _fts_ready():
+        return
+    db.session.execute(text("DELETE FROM post_fts WHERE rowid = :id"), {"id": post_id})
+
+
+def unindex_posts(post_ids):
+    """Remove many posts from the SQLite FTS table (bulk deletes). Caller commits."""
+    if not post_ids or not _fts_ready():
+        return
+    db.session.execute(
+        text("DELETE FROM post_fts WHERE rowid IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(post_ids)}
+    )
+
+
+def index_posts(post_ids):
+    """Add freshly inserted posts to the SQLite FTS table (bulk loads). Caller commits."""
+    if not post_ids or not _fts_ready():
+        return
+    db.session.execute(
+        text(
+            "INSERT INTO post_fts (rowid, title, content) "
+            "SELECT id, title, content FROM post WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": list(post_ids)}
+    )
+
+
+def rebuild_search_index():
+    """Create the index if missing and re-index every post (SQLite).
+
+    PostgreSQL maintains its generated column itself.
+    """
+    if not create_search_index() and _dialect() == "sqlite":
+        db.session.execute(text("DELETE FROM post_fts"))
+        db.session.execute(text(
+            "INSERT INTO post_fts (rowid, title, content) "
+            "SELECT id, title, content FROM post"
+        ))
+    db.session.commit()
+
+
+def _fts5_query(q):
+    # quote every term so user input can't break FTS5 query syntax
+    return " ".join('"' + term.replace('"', '""') + '"' for term in q.split())
+
+
+def _like_pattern(q):
+    # match % and _ literally, used with ESCAPE '\'
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SearchPage:
+
+    def __init__(self, items, query, page, has_next):
+        self.items = items
+        self.query = query
+        self.page = page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+
+def _ranked_ids(q, limit, offset):
+    dialect = _dialect() if search_index_ready() else None
+    params = {"limit": limit, "offset": offset}
+
+    if dialect == "postgresql":
+        params["q"] = q
+        sql = (
+            "SELECT id FROM post, websearch_to_tsquery('english', :q) AS query "
+            "WHERE search_vector @@ query "
+            "ORDER BY ts_rank(search_vector, query) DESC, id DESC "
+            "LIMIT :limit OFFSET :offset"
+        )
+    elif dialect == "sqlite":
+        params["q"] = _fts5_query(q)
+        sql = (
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH :q "
+            "ORDER BY bm25(post_fts, 2.0, 1.0), rowid DESC "
+            "LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["q"] = _like_pattern(q)
+        sql = (
+            "SELECT id FROM post "
+            "WHERE title LIKE :q ESCAPE '\\' OR content LIKE :q ESCAPE '\\' "
+            "ORDER BY date_posted DESC, id DESC "
+            "LIMIT :limit OFFSET :offset"
+        )
+
+    return [row[0] for row in db.session.execute(text(sql), params)]
+
+
+def search_posts(q, page=1, per_page=None):
+    """Return a SearchPage of posts matching ``q``, best match first."""
+    per_page = per_page or current_app.config["POSTS_PER_PAGE"]
+    page = max(page, 1)
+    q = (q or "").strip()
+    if not q:
+        return SearchPage([], q, page, False)
+
+    ids = _ranked_ids(q, per_page + 1, (page - 1) * per_page)
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+
+    posts = {
+        post.id: post for post in
+        Post.query.options(joinedload(Post.author)).filter(Post.id.in_(ids))
+    } if ids else {}
+    return SearchPage([posts[i] for i in ids if i in posts], q, page, has_next)
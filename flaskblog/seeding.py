@@ -0,0 +1,290 @@
+from datetime import datetime, timedelta
+import json
+import os
+import random
+import re
+
+from flask import current_app
+from sqlalchemy import func, insert, select, text
+
+from flaskblog import db
+from flaskblog.models import User, Post, PostLike, Comment
+from flaskblog.passwords import hash_password
+from flaskblog.search import index_posts
+
+# =====================================================
+# BULK LOADING
+#
+# import_posts(): posts from a JSON array (posts.json)
+# or JSON Lines, parsed incrementally and validated.
+# synthesize(): fake users, posts, likes and threaded
+# comments at any scale, e.g. for capacity tests.
+#
+# Rows are written with one executemany per table and
+# committed chunk by chunk, so memory stays bounded and
+# an interrupted load keeps every finished chunk. Posts
+# are inserted with their final like/comment counters
+# and indexed for search in the same transaction.
+# =====================================================
+
+READ_SIZE = 1 << 16
+DEFAULT_CHUNK = 1000
+TITLE_MAX = Post.__table__.c.title.type.length
+# share of synthesized comments that reply to an earlier one
+REPLY_RATIO = 0.4
+
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+class RecordError(ValueError):
+    """An input record that cannot be imported."""
+
+    def __init__(self, number, message):
+        super().__init__(f"record {number}: {message}")
+        self.number = number
+
+
+# ---------------- READING ----------------
+def read_records(stream, fmt="auto"):
+    """Yield (record number, parsed value) from a JSON array or JSON Lines stream."""
+    head = stream.read(READ_SIZE)
+    if fmt == "auto":
+        fmt = "json" if head.lstrip().startswith("[") else "jsonl"
+    if fmt == "json":
+        return _json_array(head, stream)
+    return _json_lines(head, stream)
+
+
+def _json_array(head, stream):
+    decoder = json.JSONDecoder()
+    buffer = head.lstrip()
+    if not buffer.startswith("["):
+        raise RecordError(1, "expected a JSON array")
+    pos = 1
+    number = 0
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            more = stream.read(READ_SIZE)
+            if not more:
+                raise RecordError(number + 1, f"invalid JSON ({e.msg})") from None
+            # drop what was consumed, keep the partial record
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        number += 1
+        yield number, value
+        pos = end
+
+
+def _json_lines(head, stream):
+    # finish the line the first read may have cut
+    lines = (head + stream.readline()).splitlines()
+    number = 0
+    for line in _chain(lines, stream):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise RecordError(number, f"invalid JSON ({e.msg})") from None
+
+
+def _chain(first, rest):
+    yield from first
+    yield from rest
+
+
+# ---------------- VALIDATION ----------------
+def clean_post(number, record, user_id=None):
+    """Turn one input record into a post row, or raise RecordError."""
+    if not isinstance(record, dict):
+        raise RecordError(number, "expected an object")
+
+    title = record.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise RecordError(number, "title is required")
+    if len(title) > TITLE_MAX:
+        raise RecordError(number, f"title is longer than {TITLE_MAX} characters")
+    content = record.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise RecordError(number, "content is required")
+
+    if user_id is None:
+        user_id = record.get("user_id")
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            raise RecordError(number, "user_id must be an integer")
+
+    row = {"title": title, "content": content, "user_id": user_id}
+    if record.get("date_posted") is not None:
+        try:
+            row["date_posted"] = datetime.fromisoformat(record["date_posted"])
+        except (TypeError, ValueError):
+            raise RecordError(number, "date_posted is not an ISO 8601 timestamp") from None
+        row["updated_at"] = row["date_posted"]
+    return row
+
+
+# ---------------- IMPORT ----------------
+def import_posts(records, user_id=None, chunk_size=DEFAULT_CHUNK, skip_invalid=False):
+    """Insert posts from read_records() output. Returns (imported, skipped errors).
+
+    ``user_id`` assigns every post to one author instead of the
+    records' own user_id. Without ``skip_invalid`` the first bad record
+    raises RecordError; chunks committed before it stay.
+    """
+    imported, skipped = 0, []
+    chunk = []
+
+    def flush():
+        nonlocal imported
+        authors = {row["user_id"] for _, row in chunk}
+        known = set(db.session.scalars(select(User.id).where(User.id.in_(authors))))
+        rows = []
+        for number, row in chunk:
+            if row["user_id"] in known:
+                rows.append(row)
+                continue
+            error = RecordError(number, f"user {row['user_id']} does not exist")
+            if not skip_invalid:
+                db.session.rollback()
+                raise error
+            skipped.append(error)
+        if rows:
+            _insert_posts(rows)
+            db.session.commit()
+            imported += len(rows)
+        chunk.clear()
+
+    for number, record in records:
+        try:
+            chunk.append((number, clean_post(number, record, user_id)))
+        except RecordError as error:
+            if not skip_invalid:
+                raise
+            skipped.append(error)
+            continue
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return imported, skipped
+
+
+def _insert_posts(rows):
+    # counters start at zero (the column defaults), so they are consistent
+    ids = db.session.scalars(insert(Post).returning(Post.id), rows).all()
+    index_posts(ids)
+
+
+# ---------------- SYNTHETIC DATA ----------------
+def _templates():
+    path = os.path.join(os.path.dirname(current_app.root_path), "posts.json")
+    try:
+        with open(path) as f:
+            return [(t["title"], t["content"]) for t in json.load(f)]
+    except OSError:
+        return [("Synthetic post", "Generated for load testing.")]
+
+
+def _next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def synthesize(users, posts, likes_per_post=5, comments_per_post=4, seed=0,
+               chunk_size=DEFAULT_CHUNK, password="password", progress=None):
+    """Generate a consistent fake data set. Returns row counts per table.
+
+    Users are named user<id>; posts reuse posts.json for their text and
+    go to random synthetic users. Each post gets 0..2x the given averages
+    of likes and comments, a share of comments replying to earlier ones
+    on the same post. The same ``seed`` on an empty database always
+    produces the same rows, timestamps aside. Ids are assigned here, so nothing else
+    should write to the database during the load.
+    """
+    if posts and not users:
+        raise ValueError("synthetic posts need synthetic users to belong to")
+    rng = random.Random(seed)
+    templates = _templates()
+    counts = {"users": 0, "posts": 0, "likes": 0, "comments": 0}
+
+    first_user = _next_id(User)
+    user_ids = range(first_user, first_user + users)
+    hashed = hash_password(password)
+    for start in range(0, users, chunk_size):
+        db.session.execute(insert(User), [
+            {"id": n, "username": f"user{n}", "email": f"user{n}@example.com",
+             "password": hashed, "verified": True}
+            for n in user_ids[start:start + chunk_size]
+        ])
+        db.session.commit()
+        counts["users"] += len(user_ids[start:start + chunk_size])
+        if progress:
+            progress(counts)
+
+    next_post, next_comment = _next_id(Post), _next_id(Comment)
+    newest = datetime.utcnow()
+    for start in range(0, posts, chunk_size):
+        post_rows, like_rows, comment_rows = [], [], []
+        for n in range(start, min(start + chunk_size, posts)):
+            post_id = next_post + n
+            # oldest first, one minute apart, ending now
+            posted = newest - timedelta(minutes=posts - n)
+            title, content = templates[n % len(templates)]
+
+            likers = rng.sample(user_ids, min(users, rng.randint(0, 2 * likes_per_post)))
+            like_rows.extend(
+                {"user_id": user_id, "post_id": post_id, "timestamp": posted}
+                for user_id in likers
+            )
+            thread = []
+            for _ in range(rng.randint(0, 2 * comments_per_post)):
+                parent_id = rng.choice(thread) if thread and rng.random() < REPLY_RATIO else None
+                comment_rows.append({
+                    "id": next_comment, "content": f"Comment {next_comment}",
+                    "user_id": rng.choice(user_ids), "post_id": post_id,
+                    "parent_id": parent_id, "timestamp": posted,
+                })
+                thread.append(next_comment)
+                next_comment += 1
+
+            post_rows.append({
+                "id": post_id, "title": f"{title[:TITLE_MAX - 12]} #{post_id}",
+                "content": content, "user_id": rng.choice(user_ids),
+                "date_posted": posted, "updated_at": posted,
+                "like_count": len(likers), "comment_count": len(thread),
+            })
+
+        # parents first: replies reference earlier comment ids
+        db.session.execute(insert(Post), post_rows)
+        if like_rows:
+            db.session.execute(insert(PostLike), like_rows)
+        if comment_rows:
+            db.session.execute(insert(Comment), comment_rows)
+        index_posts([row["id"] for row in post_rows])
+        db.session.commit()
+        counts["posts"] += len(post_rows)
+        counts["likes"] += len(like_rows)
+        counts["comments"] += len(comment_rows)
+        if progress:
+            progress(counts)
+
+    sync_sequences(("user", "post", "post_like", "comment"))
+    return counts
+
+
+def sync_sequences(tables):
+    """After inserting explicit ids, move PostgreSQL id sequences past them."""
+    if db.engine.dialect.name != "postgresql":
+        return
+    for table in tables:
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)"
+        ))
+    db.session.commit()
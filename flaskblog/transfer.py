@@ -0,0 +1,320 @@
+import csv
+from datetime import datetime
+import glob
+import io
+import json
+import os
+
+from sqlalchemy import Boolean, DateTime, Integer, String, func, insert, select
+
+from flaskblog import db
+from flaskblog.search import rebuild_search_index
+from flaskblog.seeding import sync_sequences
+
+# =====================================================
+# EXPORT / IMPORT (backups, SQLite <-> Neon moves)
+#
+# Each table is read in primary-key order through a
+# streaming cursor (yield_per: server-side on
+# PostgreSQL), so memory stays at one batch whatever
+# the table size. Output per table:
+#
+#   jsonl   -> <dir>/<table>.jsonl
+#   csv     -> <dir>/<table>.csv
+#   parquet -> <dir>/<table>/part-00001.parquet ...
+#              (needs pyarrow)
+#
+# After every batch the last exported id (and the file
+# offset) goes to <dir>/export-checkpoint.json, so
+# --resume picks up exactly where a killed run stopped.
+# Imports checkpoint the same way and insert parents
+# before children, keeping the original ids.
+#
+# Tables are read one after another, not as a single
+# snapshot: export from a quiet database or a replica.
+# =====================================================
+
+FORMATS = ("jsonl", "csv", "parquet")
+DEFAULT_BATCH = 5000
+EXPORT_CHECKPOINT = "export-checkpoint.json"
+IMPORT_CHECKPOINT = "import-checkpoint.json"
+
+
+class TransferError(Exception):
+    pass
+
+
+def _tables(names):
+    # metadata order puts referenced tables first
+    tables = [table for table in db.metadata.sorted_tables if "id" in table.c]
+    if not names:
+        return tables
+    unknown = set(names) - {table.name for table in tables}
+    if unknown:
+        raise TransferError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+    return [table for table in tables if table.name in names]
+
+
+# ---------------- CHECKPOINTS ----------------
+def _load_checkpoint(path, fmt):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {"format": fmt, "tables": {}}
+    if state["format"] != fmt:
+        raise TransferError(f"{path} belongs to a {state['format']} run, not {fmt}")
+    return state
+
+
+def _save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------------- VALUES ----------------
+def _dump_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _parse_value(column, value, empty_is_null=False):
+    """Undo the text encoding of jsonl/csv for one column."""
+    if not isinstance(value, str):
+        return value
+    if value == "" and (empty_is_null or not isinstance(column.type, String)):
+        # csv has no NULL, export_tables writes it as an empty field
+        return None if column.nullable else value
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Boolean):
+        return value.lower() in ("true", "1")
+    if isinstance(column.type, Integer):
+        return int(value)
+    return value
+
+
+def _arrow_schema(table):
+    pa = _pyarrow()[0]
+    types = []
+    for column in table.c:
+        if isinstance(column.type, Boolean):
+            kind = pa.bool_()
+        elif isinstance(column.type, Integer):
+            kind = pa.int64()
+        elif isinstance(column.type, DateTime):
+            kind = pa.timestamp("us")
+        else:
+            kind = pa.string()
+        types.append(pa.field(column.name, kind, nullable=column.nullable))
+    return pa.schema(types)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise TransferError("Parquet needs pyarrow: pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+
+# ---------------- WRITERS ----------------
+class _FileWriter:
+    """jsonl/csv: one file per table, cut back to the checkpointed offset."""
+
+    def __init__(self, path, table, fmt, entry):
+        self.table = table
+        self.fmt = fmt
+        self.entry = entry
+        self.file = open(path, "r+b" if entry["offset"] and os.path.exists(path) else "wb")
+        self.file.seek(entry["offset"])
+        self.file.truncate()
+        if fmt == "csv" and entry["offset"] == 0:
+            self._csv([[column.name for column in table.c]])
+
+    def write(self, rows):
+        if self.fmt == "jsonl":
+            self.file.write("".join(
+                json.dumps({key: _dump_value(value) for key, value in row._mapping.items()},
+                           ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode("utf-8"))
+        else:
+            self._csv([
+                ["" if value is None else str(value).lower() if isinstance(value, bool)
+                 else _dump_value(value) for value in row]
+                for row in rows
+            ])
+
+    def _csv(self, rows):
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+        self.file.write(text.getvalue().encode("utf-8"))
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entry["offset"] = self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class _ParquetWriter:
+    """parquet: one part file per batch, written to a temp name first."""
+
+    def __init__(self, directory, table, entry):
+        self.directory = directory
+        self.table = table
+        self.entry = entry
+        self.schema = _arrow_schema(table)
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, rows):
+        pa, pq = _pyarrow()
+        data = pa.Table.from_pylist([dict(row._mapping) for row in rows], schema=self.schema)
+        path = os.path.join(self.directory, f"part-{self.entry['parts'] + 1:05d}.parquet")
+        pq.write_table(data, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def checkpoint(self):
+        self.entry["parts"] += 1
+
+    def close(self):
+        pass
+
+
+def _writer(directory, table, fmt, entry):
+    if fmt == "parquet":
+        return _ParquetWriter(os.path.join(directory, table.name), table, entry)
+    return _FileWriter(os.path.join(directory, f"{table.name}.{fmt}"), table, fmt, entry)
+
+
+# ---------------- EXPORT ----------------
+def export_tables(directory, fmt="jsonl", names=None, batch_size=DEFAULT_BATCH,
+                  resume=False, progress=None):
+    """Stream tables into ``directory``. Returns rows written per table."""
+    if fmt == "parquet":
+        _pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    checkpoint = os.path.join(directory, EXPORT_CHECKPOINT)
+    state = _load_checkpoint(checkpoint, fmt) if resume else {"format": fmt, "tables": {}}
+
+    written = {}
+    for table in _tables(names):
+        entry = state["tables"].setdefault(
+            table.name, {"last_id": None, "rows": 0, "offset": 0, "parts": 0, "done": False}
+        )
+        if entry["done"]:
+            continue
+        query = select(table).order_by(table.c.id)
+        if entry["last_id"] is not None:
+            query = query.where(table.c.id > entry["last_id"])
+
+        writer = _writer(directory, table, fmt, entry)
+        written[table.name] = 0
+        try:
+            result = db.session.execute(query.execution_options(yield_per=batch_size))
+            for rows in result.partitions():
+                writer.write(rows)
+                writer.checkpoint()
+                entry["last_id"] = rows[-1].id
+                entry["rows"] += len(rows)
+                written[table.name] += len(rows)
+                _save_checkpoint(checkpoint, state)
+                if progress:
+                    progress(table.name, entry["rows"])
+        finally:
+            writer.close()
+            db.session.rollback()
+        entry["done"] = True
+        _save_checkpoint(checkpoint, state)
+    return written
+
+
+# ---------------- IMPORT ----------------
+def _read(directory, table, fmt, batch_size):
+    """Yield batches of row dicts (already typed) from an export."""
+    if fmt == "parquet":
+        pq = _pyarrow()[1]
+        for path in sorted(glob.glob(os.path.join(directory, table.name, "part-*.parquet"))):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+                yield batch.to_pylist()
+        return
+
+    path = os.path.join(directory, f"{table.name}.{fmt}")
+    if not os.path.exists(path):
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        records = (json.loads(line) for line in f if line.strip()) if fmt == "jsonl" \
+            else csv.DictReader(f)
+        batch = []
+        for record in records:
+            batch.append({
+                key: _parse_value(table.c[key], value, empty_is_null=fmt == "csv")
+                for key, value in record.items() if key in table.c
+            })
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def import_tables(directory, fmt=None, names=None, batch_size=DEFAULT_BATCH,
+                  resume=False, progress=None):
+    """Load an export_tables() directory into the current database.
+
+    Keeps the exported ids and expects the target tables to be empty
+    (or, with ``resume``, partially filled by an earlier run).
+    Returns rows inserted per table.
+    """
+    if fmt is None:
+        # default to whatever produced the directory
+        try:
+            with open(os.path.join(directory, EXPORT_CHECKPOINT)) as f:
+                fmt = json.load(f)["format"]
+        except FileNotFoundError:
+            fmt = "jsonl"
+    checkpoint = os.path.join(directory, IMPORT_CHECKPOINT)
+    state = _load_checkpoint(checkpoint, fmt) if resume else {"format": fmt, "tables": {}}
+
+    inserted = {}
+    tables = _tables(names)
+    for table in tables:
+        entry = state["tables"].setdefault(table.name, {"last_id": None, "rows": 0, "done": False})
+        if entry["done"]:
+            continue
+        if resume:
+            # a batch is committed before its checkpoint is saved, so a
+            # run killed in between left rows the checkpoint doesn't know
+            last_id, rows = db.session.execute(
+                select(func.max(table.c.id), func.count()).select_from(table)
+            ).one()
+            if last_id is not None and (entry["last_id"] is None or last_id > entry["last_id"]):
+                entry["last_id"], entry["rows"] = last_id, rows
+        inserted[table.name] = 0
+        for batch in _read(directory, table, fmt, batch_size):
+            if entry["last_id"] is not None:
+                batch = [row for row in batch if row["id"] > entry["last_id"]]
+            if not batch:
+                continue
+            db.session.execute(insert(table), batch)
+            db.session.commit()
+            entry["last_id"] = batch[-1]["id"]
+            entry["rows"] += len(batch)
+            inserted[table.name] += len(batch)
+            _save_checkpoint(checkpoint, state)
+            if progress:
+                progress(table.name, entry["rows"])
+        entry["done"] = True
+        _save_checkpoint(checkpoint, state)
+
+    sync_sequences([table.name for table in tables])
+    if any(table.name == "post" for table in tables):
+        rebuild_search_index()
+    return inserted
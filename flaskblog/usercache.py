@@ -0,0 +1,199 @@
+from collections import OrderedDict
+import json
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from werkzeug.local import LocalProxy
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from flaskblog import db, login_manager
+from flaskblog.database import RoutingSession
+from flaskblog.models import User
+
+# =====================================================
+# SESSION USER CACHE
+#
+# Flask-Login calls load_user() on every authenticated
+# request. The user's columns are cached by id so
+# current_user can be rebuilt without a SELECT; the
+# cached copy is merged into the session with
+# load=False, so views can still modify and commit it.
+#
+# USER_CACHE_BACKEND:
+#   "local"  -> per-process LRU with TTL (default)
+#   "shared" -> redis-compatible client (USER_CACHE_URL)
+#               or an in-memory stand-in without one
+#   "none"   -> disabled
+#
+# Entries are dropped when a transaction that updated or
+# deleted a User row through the ORM commits.
+#
+# "local" only drops the entry in the worker that made
+# the change; the others serve the old row until the TTL.
+# With several workers (gunicorn -w N) use "shared" with
+# USER_CACHE_URL.
+# =====================================================
+
+# session.info key: ids to evict after the commit
+PENDING_INVALIDATION = "usercache_invalidate"
+
+# the password hash is deliberately not cached
+CACHED_COLUMNS = ("id", "username", "email", "image_file", "verified")
+
+
+class LocalBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class StandInClient:
+    """Minimal in-memory stand-in for the redis client API used below."""
+
+    def __init__(self):
+        self._local = LocalBackend(max_size=100000, ttl=float("inf"))
+
+    def get(self, name):
+        return self._local.get(name)
+
+    def set(self, name, value, ex=None):
+        self._local.set(name, value, ex)
+
+    def delete(self, *names):
+        for name in names:
+            self._local.delete(name)
+
+
+class SharedBackend:
+    """Cache shared by every worker through a redis-compatible client."""
+
+    def __init__(self, client, ttl, prefix="flaskblog:user:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + str(key))
+        return json.loads(raw) if raw else None
+
+    def set(self, key, value):
+        self.client.set(self.prefix + str(key), json.dumps(value), ex=self.ttl)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + str(key))
+
+
+class NullBackend:
+    """USER_CACHE_BACKEND=none: every lookup misses."""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+
+def _make_backend(app):
+    kind = app.config["USER_CACHE_BACKEND"]
+    ttl = app.config["USER_CACHE_TTL"]
+    if kind == "none":
+        return NullBackend()
+    if kind == "shared":
+        url = app.config.get("USER_CACHE_URL")
+        if url:
+            import redis  # optional dependency, only needed for a real shared cache
+            client = redis.Redis.from_url(url)
+        else:
+            client = StandInClient()
+        return SharedBackend(client, ttl)
+    return LocalBackend(app.config["USER_CACHE_SIZE"], ttl)
+
+
+def init_app(app):
+    app.extensions["user_cache"] = _make_backend(app)
+
+
+# the current application's cache
+user_cache = LocalProxy(lambda: current_app.extensions["user_cache"])
+
+
+def _snapshot(user):
+    return {column: getattr(user, column) for column in CACHED_COLUMNS}
+
+
+def load_cached_user(user_id):
+    user_id = int(user_id)
+    data = user_cache.get(user_id)
+    if data is not None:
+        user = User(**data)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, _snapshot(user))
+    return user
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    return load_cached_user(user_id)
+
+
+def invalidate_user(user_id):
+    user_cache.delete(int(user_id))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_write(mapper, connection, target):
+    # evicted once committed: dropping the entry at flush time would let
+    # a concurrent request cache the old row again until the TTL
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(PENDING_INVALIDATION, set()).add(target.id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate_committed(session):
+    # ids of a rolled back transaction are evicted at the next commit,
+    # which costs a cache miss at most
+    for user_id in session.info.pop(PENDING_INVALIDATION, ()):
+        invalidate_user(user_id)
@@ -90,9 +90,21 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # search structures (post_fts*, post.search_vector) are managed by hand
+    # in their own migration, keep autogenerate from dropping them
+    def include_object(object, name, type_, reflected, compare_to):
+        if reflected and compare_to is None:
+            if type_ == "table" and name.startswith("post_fts"):
+                return False
+            if type_ in ("column", "index") and "search_vector" in name:
+                return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
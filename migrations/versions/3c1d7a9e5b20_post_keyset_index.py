@@ -0,0 +1,26 @@
+"""Add composite (date_posted, id) index for keyset pagination
+
+Revision ID: 3c1d7a9e5b20
+Revises: 97e6e5c9db1f
+Create Date: 2026-10-18 09:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1d7a9e5b20'
+down_revision = '97e6e5c9db1f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.create_index('ix_post_date_posted_id', ['date_posted', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_index('ix_post_date_posted_id')
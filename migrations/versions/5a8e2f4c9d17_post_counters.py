@@ -0,0 +1,35 @@
+"""Add denormalized like_count / comment_count to post
+
+Revision ID: 5a8e2f4c9d17
+Revises: 3c1d7a9e5b20
+Create Date: 2026-10-18 10:03:17.241906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a8e2f4c9d17'
+down_revision = '3c1d7a9e5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the source tables
+    op.execute(
+        "UPDATE post SET "
+        "like_count = (SELECT COUNT(*) FROM post_like WHERE post_like.post_id = post.id), "
+        "comment_count = (SELECT COUNT(*) FROM comment WHERE comment.post_id = post.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
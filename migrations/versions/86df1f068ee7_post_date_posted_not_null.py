@@ -0,0 +1,33 @@
+"""Make post.date_posted NOT NULL
+
+Revision ID: 86df1f068ee7
+Revises: f1c7d3a8b54e
+Create Date: 2026-10-18 21:14:52.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '86df1f068ee7'
+down_revision = 'f1c7d3a8b54e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keyset cursors and (date_posted, id) comparisons need a value
+    op.execute(
+        "UPDATE post SET date_posted = COALESCE(updated_at, CURRENT_TIMESTAMP) "
+        "WHERE date_posted IS NULL"
+    )
+    op.execute("UPDATE post SET updated_at = date_posted WHERE updated_at IS NULL")
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('date_posted', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.alter_column('date_posted', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,49 @@
+"""Add full-text search index on post (tsvector/GIN or FTS5)
+
+Revision ID: 8b4f61d2e7a3
+Revises: 5a8e2f4c9d17
+Create Date: 2026-10-18 11:26:52.870114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4f61d2e7a3'
+down_revision = '5a8e2f4c9d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute(
+            "ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            "GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')"
+            ") STORED"
+        )
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_post_search_vector "
+            "ON post USING GIN (search_vector)"
+        )
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(title, content)")
+        op.execute(
+            "INSERT INTO post_fts (rowid, title, content) "
+            "SELECT id, title, content FROM post"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_post_search_vector")
+        op.execute("ALTER TABLE post DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS post_fts")
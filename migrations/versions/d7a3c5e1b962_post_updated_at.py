@@ -0,0 +1,28 @@
+"""Add post.updated_at version column
+
+Revision ID: d7a3c5e1b962
+Revises: c2e9a4b7f015
+Create Date: 2026-10-18 14:02:39.604418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3c5e1b962'
+down_revision = 'c2e9a4b7f015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE post SET updated_at = date_posted")
+
+
+def downgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,46 @@
+"""Index foreign keys and the timestamp orderings hot queries use
+
+Revision ID: e4b8c2d6f1a9
+Revises: d7a3c5e1b962
+Create Date: 2026-10-18 16:20:07.118254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8c2d6f1a9'
+down_revision = 'd7a3c5e1b962'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('post', 'ix_post_user_id_date_posted_id', ['user_id', 'date_posted', 'id']),
+    ('comment', 'ix_comment_post_id_parent_id_timestamp', ['post_id', 'parent_id', 'timestamp', 'id']),
+    ('comment', 'ix_comment_parent_id', ['parent_id']),
+    ('comment', 'ix_comment_user_id', ['user_id']),
+    ('post_like', 'ix_post_like_post_id', ['post_id']),
+    ('password_history', 'ix_password_history_user_id_timestamp', ['user_id', 'timestamp']),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # build without locking out writes; CONCURRENTLY cannot run
+        # inside a transaction
+        with op.get_context().autocommit_block():
+            for table, name, columns in INDEXES:
+                op.create_index(name, table, columns, unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+        return
+
+    for table, name, columns in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
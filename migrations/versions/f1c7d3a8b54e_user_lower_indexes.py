@@ -0,0 +1,39 @@
+"""Index lower(username) and lower(email) for availability checks
+
+Revision ID: f1c7d3a8b54e
+Revises: e4b8c2d6f1a9
+Create Date: 2026-10-18 18:05:41.530927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7d3a8b54e'
+down_revision = 'e4b8c2d6f1a9'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_user_lower_username', 'lower(username)'),
+    ('ix_user_lower_email', 'lower(email)'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, expression in INDEXES:
+                op.create_index(name, 'user', [sa.text(expression)], unique=False,
+                                postgresql_concurrently=True, if_not_exists=True)
+        return
+
+    # expression indexes need no table rebuild, so no batch mode here
+    for name, expression in INDEXES:
+        op.create_index(name, 'user', [sa.text(expression)], unique=False)
+
+
+def downgrade():
+    for name, expression in reversed(INDEXES):
+        op.drop_index(name, table_name='user')
@@ -0,0 +1,62 @@
+import pytest
+
+from flaskblog import create_app, db
+from flaskblog.models import Post
+from flaskblog.search import rebuild_search_index
+from flaskblog.seeding import synthesize
+
+# =====================================================
+# TEST APPLICATION
+#
+# A fresh SQLite database per test, seeded with a small
+# synthetic data set (flask seed). Query budgets are
+# enforced, so a view going over its budget fails the
+# test instead of logging a warning.
+# =====================================================
+
+PASSWORD = "password"
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "test",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "WTF_CSRF_ENABLED": False,
+        "RATELIMIT_BACKEND": "none",
+        "QUERY_BUDGET_ENFORCE": True,
+    })
+    with app.app_context():
+        db.create_all()
+        rebuild_search_index()
+        synthesize(users=5, posts=40, likes_per_post=3, comments_per_post=3, seed=1,
+                   password=PASSWORD)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def sample(app):
+    """A post with comments and its author's name."""
+    with app.app_context():
+        post = db.session.scalars(
+            db.select(Post).where(Post.comment_count > 0).order_by(Post.id).limit(1)
+        ).one()
+        return {"post_id": post.id, "username": post.author.username, "user_id": post.user_id}
+
+
+@pytest.fixture
+def logged_in(client, sample):
+    """The test client, logged in as the sample post's author."""
+    response = client.post("/login", data={
+        "email": f"user{sample['user_id']}@example.com", "password": PASSWORD
+    })
+    assert response.status_code == 302, response.get_data(as_text=True)
+    return client
@@ -0,0 +1,24 @@
+from flaskblog import db
+from flaskblog.models import Comment, User
+
+
+def test_post_etag_changes_when_a_commenter_is_renamed(app, client, sample):
+    path = f"/post/{sample['post_id']}"
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.last_modified is None
+    etag = first.get_etag()[0]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    with app.app_context():
+        commenter = db.session.scalar(
+            db.select(User).join(Comment, Comment.user_id == User.id)
+            .where(Comment.post_id == sample["post_id"], User.id != sample["user_id"])
+            .limit(1)
+        )
+        commenter.username = "renamed"
+        db.session.commit()
+
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "renamed" in response.get_data(as_text=True)
@@ -0,0 +1,20 @@
+from flaskblog.querycount import count_queries
+
+
+def statements_for(app, client, path):
+    with app.app_context(), count_queries() as statements:
+        assert client.get(path).status_code == 200
+    return len(statements)
+
+
+def test_page_cache_key_ignores_unknown_arguments(app, client):
+    assert statements_for(app, client, "/home") > 0
+    assert statements_for(app, client, "/home?utm_source=mail") == 0
+    assert statements_for(app, client, "/?page=1&ref=x") > 0
+    assert statements_for(app, client, "/?page=1") == 0
+
+
+def test_page_cache_key_keeps_pagination_arguments(app, client):
+    statements_for(app, client, "/home")
+    assert statements_for(app, client, "/home?page=2") > 0
+    assert statements_for(app, client, "/home?page=2&x=1") == 0
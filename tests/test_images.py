@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from PIL import Image
+import pytest
+
+from flaskblog import images
+
+
+@pytest.fixture
+def pictures(app, tmp_path, monkeypatch):
+    directory = tmp_path / "profile_pics"
+    directory.mkdir()
+    monkeypatch.setattr(images, "pictures_dir", lambda: str(directory))
+    return directory
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = tmp_path / "upload.png"
+    Image.new("RGB", (300, 200), (200, 10, 10)).save(path, "PNG")
+    return str(path)
+
+
+def test_same_picture_rendered_concurrently(app, pictures, upload):
+    digest = "0123456789abcd"
+    with app.app_context(), ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: images._render_variants(upload, digest), range(8)))
+    assert sorted(os.listdir(pictures)) == sorted(images._files_for(images.variant_name(digest)))
+
+
+def test_recently_reused_picture_is_not_collected(app, pictures, upload):
+    digest = "0123456789abcd"
+    name = images.variant_name(digest)
+    with app.app_context():
+        images._render_variants(upload, digest)
+        # a duplicate upload just reused it, its user is not committed yet
+        assert images.collect_orphans([name]) == []
+
+        stale = os.path.getmtime(pictures / name) - images.ORPHAN_GRACE_SECONDS - 1
+        for filename in os.listdir(pictures):
+            os.utime(pictures / filename, (stale, stale))
+        assert images.collect_orphans([name])[0] == name
+    assert os.listdir(pictures) == []
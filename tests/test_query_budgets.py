@@ -0,0 +1,73 @@
+import pytest
+
+from flaskblog import db
+from flaskblog.querycount import QueryBudgetExceeded, count_queries, query_budget
+
+# path and the view's own budget; the whole request must fit in it
+# once the logged-in user comes from the user cache
+FEEDS = {
+    "home": ("/home", 3),
+    "user_posts": ("/user/{username}", 4),
+    "post": ("/post/{post_id}", 4),
+}
+
+
+def get_counted(app, client, path):
+    """GET ``path``, returning the response and the statements it ran."""
+    with app.app_context(), count_queries() as statements:
+        response = client.get(path)
+    assert response.status_code == 200, path
+    return response, statements
+
+
+def feed_path(name, sample):
+    path, _ = FEEDS[name]
+    return path.format(**sample)
+
+
+@pytest.mark.parametrize("mode", ["offset", "keyset"])
+@pytest.mark.parametrize("name", sorted(FEEDS))
+def test_feed_within_budget_anonymous(app, client, sample, name, mode):
+    app.config["PAGINATION_MODE"] = mode
+    _, statements = get_counted(app, client, feed_path(name, sample))
+    assert len(statements) <= FEEDS[name][1]
+
+
+@pytest.mark.parametrize("mode", ["offset", "keyset"])
+@pytest.mark.parametrize("name", sorted(FEEDS))
+def test_feed_within_budget_logged_in(app, logged_in, sample, name, mode):
+    app.config["PAGINATION_MODE"] = mode
+    path = feed_path(name, sample)
+    get_counted(app, logged_in, path)
+    # second request: the user comes from the user cache
+    _, statements = get_counted(app, logged_in, path)
+    assert len(statements) <= FEEDS[name][1]
+
+
+@pytest.mark.parametrize("name", ["home", "user_posts"])
+def test_feed_statements_do_not_grow_with_page_size(app, logged_in, sample, name):
+    path = feed_path(name, sample)
+    get_counted(app, logged_in, path)
+
+    app.config["POSTS_PER_PAGE"] = 2
+    _, small = get_counted(app, logged_in, path)
+    app.config["POSTS_PER_PAGE"] = 20
+    _, large = get_counted(app, logged_in, path)
+    assert len(large) == len(small)
+
+
+def test_anonymous_page_cache_hit_runs_no_statements(app, client):
+    get_counted(app, client, "/home")
+    _, statements = get_counted(app, client, "/home")
+    assert statements == []
+
+
+def test_budget_enforced(app):
+    @query_budget(1)
+    def view():
+        db.session.execute(db.text("SELECT 1"))
+        db.session.execute(db.text("SELECT 2"))
+        return "ok"
+
+    with app.test_request_context(), pytest.raises(QueryBudgetExceeded):
+        view()
@@ -0,0 +1,21 @@
+import pytest
+
+from flaskblog import db
+from flaskblog.queryplans import check_query_plans
+
+
+@pytest.mark.parametrize("mode", ["offset", "keyset"])
+def test_no_unexpected_full_scans(app, mode):
+    app.config["PAGINATION_MODE"] = mode
+    with app.app_context():
+        checked, problems = check_query_plans()
+    assert checked > 0
+    assert problems == []
+
+
+def test_missing_index_is_reported(app):
+    with app.app_context():
+        db.session.execute(db.text("DROP INDEX ix_user_lower_email"))
+        db.session.commit()
+        _, problems = check_query_plans()
+    assert ("account availability", "user") in {(label, table) for label, table, _ in problems}
@@ -0,0 +1,19 @@
+import pytest
+
+from flaskblog import db, search
+from flaskblog.models import Post
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("100%", {"100% sure"}),
+    ("a_b", {"a_b"}),
+    ("c:\\d", {"c:\\d"}),
+])
+def test_like_fallback_matches_wildcards_literally(app, sample, monkeypatch, q, expected):
+    monkeypatch.setattr(search, "search_index_ready", lambda: False)
+    with app.app_context():
+        for title in ("100% sure", "1000 sure", "a_b", "axb", "c:\\d", "c:d"):
+            db.session.add(Post(title=title, content="-", user_id=sample["user_id"]))
+        db.session.commit()
+        found = {post.title for post in search.search_posts(q, per_page=50).items}
+    assert found == expected
@@ -0,0 +1,38 @@
+import pytest
+
+from flaskblog import create_app, db, transfer
+from flaskblog.models import Post
+
+
+def test_resume_after_crash_between_commit_and_checkpoint(app, tmp_path, monkeypatch):
+    with app.app_context():
+        transfer.export_tables(tmp_path / "export", names=["user", "post"], batch_size=7)
+        total = db.session.scalar(db.select(db.func.count()).select_from(Post))
+
+    target = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "test",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'target.db'}",
+        "RATELIMIT_BACKEND": "none",
+    })
+    save = transfer._save_checkpoint
+    saves = []
+
+    def crash_once(path, state):
+        # the third post batch is committed, then the process dies
+        if state["tables"].get("post", {}).get("rows") == 14 and not saves:
+            saves.append(path)
+            raise KeyboardInterrupt
+        save(path, state)
+
+    with target.app_context():
+        db.create_all()
+        monkeypatch.setattr(transfer, "_save_checkpoint", crash_once)
+        with pytest.raises(KeyboardInterrupt):
+            transfer.import_tables(tmp_path / "export", names=["user", "post"], batch_size=7)
+        monkeypatch.setattr(transfer, "_save_checkpoint", save)
+
+        transfer.import_tables(tmp_path / "export", names=["user", "post"], batch_size=7,
+                               resume=True)
+        assert db.session.scalar(db.select(db.func.count()).select_from(Post)) == total
+        db.engine.dispose()